@@ -0,0 +1,243 @@
+"""
+Sending a campaign from several accounts.
+
+The daily limit of a single account (500 messages for Gmail) is what bounds
+a campaign, so an AccountPool spreads the recipients over several configured
+accounts, e.g. config_gmail and config_hostinger. Each Account keeps its own
+SMTP sessions and its own RateLimiter, so every account tracks its remaining
+quota. Each message goes to the account with the most unused capacity
+(weighted round robin, by default weighted by the daily capacity of the
+account's budgets), skipping accounts that must wait for their budget.
+An account that answers with a sending limit error is dropped for the rest
+of the run and the message is sent from another one.
+
+An AccountPool can be given to AsyncSender in place of its SmtpPool:
+
+    pool = AccountPool([Account(config_gmail), Account(config_hostinger)])
+    AsyncSender(None, connections=pool.connections, pool=pool).send_all(jobs)
+"""
+import smtplib
+import threading
+
+from message_factory import encode_header
+from rate_limiter import PERIODS, rate_limiter_from_config
+from send_retry import QuotaExceeded, classify
+from smtp_transport import SmtpPool, transport_from_config
+
+
+class AccountsExhausted(QuotaExceeded):
+    """Every account reached its sending limit, or sending was stopped."""
+
+
+def uses_ssl(config):
+    """SMTP_SSL from the config, or SSL when the port is 465."""
+    return getattr(config, 'SMTP_SSL', config.SMTP_PORT == 465)
+
+
+def daily_capacity(limiter):
+    """Messages per day the limiter's budgets allow (None if unlimited)."""
+    if limiter is None or not (limiter.buckets or limiter.windows):
+        return None
+    budgets = [*limiter.buckets.values(), *limiter.windows.values()]
+    return min(
+        budget.capacity * PERIODS['per_day'] / budget.period
+        for budget in budgets
+    )
+
+
+class Account:
+    """
+    One sending account.
+
+    Args:
+        config: Config module of the account (config_gmail, ...)
+        connections: SMTP sessions kept open for this account
+        limiter: RateLimiter of the account (none if None)
+        use_ssl: SMTP over SSL; by default from the config (see uses_ssl)
+        weight: Share of the messages; SEND_WEIGHT in the config or the
+            daily capacity of the limiter by default
+    """
+
+    def __init__(self, config, connections=1, limiter=None, use_ssl=None,
+                 weight=None):
+        self.config = config
+        self.name = config.EMAIL_USER
+        self.connections = connections
+        self.limiter = limiter
+        self.use_ssl = uses_ssl(config) if use_ssl is None else use_ssl
+        self.weight = (
+            weight or getattr(config, 'SEND_WEIGHT', None)
+            or daily_capacity(limiter) or 1
+        )
+        self.from_line = encode_header(
+            'From', getattr(config, 'EMAIL_FROM', config.EMAIL_USER)
+        )
+        self.pool = SmtpPool(
+            lambda: transport_from_config(config, use_ssl=self.use_ssl, limiter=limiter),
+            size=connections,
+        )
+        self.sent = 0
+        self.exhausted = False
+        self.current = 0.0
+
+    def remaining(self):
+        """Messages the account can still send now (None if unlimited)."""
+        if self.limiter is None:
+            return None
+        return self.limiter.remaining()
+
+
+def with_from_line(message, from_line):
+    """
+    The message bytes with their From header, including any folded
+    continuation lines, replaced by from_line (added if there is none).
+    """
+    end = message.find(b'\r\n\r\n')
+    headers_end = len(message) if end < 0 else end + 2
+
+    def line_end(pos):
+        stop = message.find(b'\r\n', pos, headers_end)
+        return headers_end if stop < 0 else stop + 2
+
+    pos = 0
+    while pos < headers_end:
+        stop = line_end(pos)
+        if message[pos:pos + 5].lower() == b'from:':
+            while stop < headers_end and message[stop:stop + 1] in (b' ', b'\t'):
+                stop = line_end(stop)
+            return message[:pos] + from_line + message[stop:]
+        pos = stop
+    return from_line + message
+
+
+class AccountPool:
+    """
+    Several accounts used as one SmtpPool.
+
+    Args:
+        accounts: List of Account
+        max_wait: Longest wait (seconds) for any account's budget before
+            giving up with AccountsExhausted
+    """
+
+    def __init__(self, accounts, max_wait=900):
+        if not accounts:
+            raise ValueError("at least one account is needed")
+        self.accounts = accounts
+        self.max_wait = max_wait
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    @property
+    def connections(self):
+        """SMTP sessions of all the accounts (one sending worker each)."""
+        return sum(account.connections for account in self.accounts)
+
+    def _reserve(self):
+        """
+        Pick an account with budget for one message.
+
+        Returns:
+            (account, 0) or (None, seconds to wait before trying again)
+        """
+        with self.lock:
+            candidates = [a for a in self.accounts if not a.exhausted]
+            if not candidates:
+                raise AccountsExhausted("all accounts reached their sending limit")
+            # Smooth weighted round robin over the accounts with budget now
+            total = sum(a.weight for a in candidates)
+            for account in candidates:
+                account.current += account.weight
+            waits = []
+            for account in sorted(candidates, key=lambda a: -a.current):
+                wait = account.limiter.reserve() if account.limiter else 0.0
+                if not wait:
+                    account.current -= total
+                    return account, 0.0
+                waits.append(wait)
+            return None, min(waits)
+
+    def _account(self):
+        while True:
+            if self.stopping.is_set():
+                raise AccountsExhausted("sending stopped")
+            account, wait = self._reserve()
+            if account:
+                return account
+            if wait > self.max_wait:
+                raise AccountsExhausted(
+                    f"sending limit of every account reached; next message "
+                    f"allowed in {wait / 60:.0f} minutes"
+                )
+            # Wakes up at once when the sender stops (see stop)
+            self.stopping.wait(wait)
+
+    def stop(self):
+        """Make the threads waiting for a budget give up."""
+        self.stopping.set()
+
+    def sendmail(self, from_addr, to_addrs, message):
+        """
+        Send from the next account, failing over to the others when an
+        account reaches its sending limit.
+        """
+        while True:
+            account = self._account()
+            if not message.startswith(account.from_line):
+                # Sent as the account, so SPF/DKIM match the From header
+                message = with_from_line(message, account.from_line)
+            try:
+                result = account.pool.sendmail(account.name, to_addrs, message)
+            except smtplib.SMTPException as e:
+                if classify(e) != 'quota':
+                    raise
+                with self.lock:
+                    if not account.exhausted:
+                        account.exhausted = True
+                        print(f"⚠️ {account.name} reached its sending limit "
+                              f"({str(e)}); using the other accounts")
+                continue
+            with self.lock:
+                account.sent += 1
+            return result
+
+    def summary(self):
+        """One line per account: messages sent and quota left."""
+        lines = []
+        for account in self.accounts:
+            remaining = account.remaining()
+            left = "no limit" if remaining is None else f"{remaining} left"
+            state = ", limit reached" if account.exhausted else ""
+            lines.append(f"{account.name}: {account.sent} sent ({left}{state})")
+        return lines
+
+    def close(self):
+        """Close the sessions and save the budgets of every account."""
+        for account in self.accounts:
+            try:
+                account.pool.close()
+            finally:
+                if account.limiter:
+                    account.limiter.save()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def account_pool_from_configs(configs, connections=1, state_path=None, **defaults):
+    """
+    AccountPool with one Account per config module, each with `connections`
+    sessions and a RateLimiter from rate_limiter_from_config (defaults are
+    the script's budgets, overridden by SEND_LIMIT_* in each config).
+    """
+    return AccountPool([
+        Account(
+            config,
+            connections=connections,
+            limiter=rate_limiter_from_config(config, state_path=state_path, **defaults),
+        )
+        for config in configs
+    ])
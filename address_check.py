@@ -0,0 +1,161 @@
+"""
+Offline pre-flight check of the recipient addresses of a roster.
+
+A malformed address used to be found only when the SMTP server refused it,
+after connecting, authenticating and building the message with its
+attachment. An AddressCheck goes over the whole roster once, before anything
+is rendered or sent, and for every row:
+
+- normalizes the address: surrounding spaces, quotes, "mailto:" and
+  "Name <address>" are removed and it is lowercased
+- fixes common typos in the domain (gmial.com, hotmial.com, gmail.con, ...)
+- rejects addresses that are missing, malformed or in the suppression list
+
+The suppression list is a text file with one address per line; a line like
+@example.com suppresses a whole domain and lines starting with # are
+comments.
+"""
+import os
+import re
+from email.utils import parseaddr
+
+# Misspelled domain -> domain meant
+DOMAIN_TYPOS = {
+    'gmial.com': 'gmail.com', 'gmai.com': 'gmail.com', 'gmal.com': 'gmail.com',
+    'gamil.com': 'gmail.com', 'gnail.com': 'gmail.com', 'gmaill.com': 'gmail.com',
+    'gmail.co': 'gmail.com', 'gmail.cm': 'gmail.com', 'gmail.om': 'gmail.com',
+    'gmail.com.ar': 'gmail.com', 'gmail.es': 'gmail.com',
+    'hotmial.com': 'hotmail.com', 'hotmai.com': 'hotmail.com',
+    'hotmal.com': 'hotmail.com', 'hotmil.com': 'hotmail.com',
+    'hotamil.com': 'hotmail.com', 'homail.com': 'hotmail.com',
+    'hotmail.co': 'hotmail.com', 'hotmail.cm': 'hotmail.com',
+    'hotmial.com.ar': 'hotmail.com.ar', 'hotmial.es': 'hotmail.es',
+    'yahooo.com': 'yahoo.com', 'yaho.com': 'yahoo.com', 'yhaoo.com': 'yahoo.com',
+    'yahoo.co': 'yahoo.com', 'yaho.com.ar': 'yahoo.com.ar',
+    'outlok.com': 'outlook.com', 'outllok.com': 'outlook.com',
+    'outloo.com': 'outlook.com', 'otlook.com': 'outlook.com',
+}
+
+# Misspelled .com endings, fixed on any domain
+TLD_TYPOS = {'con': 'com', 'cmo': 'com', 'ocm': 'com', 'comm': 'com', 'coom': 'com'}
+
+_ATOM = r"[a-z0-9!#$%&'*+/=?^_`{|}~-]+"
+_ADDRESS = re.compile(
+    rf"{_ATOM}(?:\.{_ATOM})*"
+    r"@(?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+[a-z]{2,}"
+)
+
+
+def load_suppression_list(path):
+    """
+    Addresses (and @domains) of a suppression list file, normalized; an
+    empty set if the file does not exist.
+    """
+    suppressed = set()
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip().lower()
+                if line and not line.startswith('#'):
+                    suppressed.add(line)
+    return suppressed
+
+
+def _clean(value):
+    """The address in a roster cell, lowercase and without spaces."""
+    value = value.strip().strip('"\'').strip()
+    if '<' in value:
+        value = parseaddr(value)[1]
+    if value.lower().startswith('mailto:'):
+        value = value[len('mailto:'):]
+    return ''.join(value.split()).strip('.,;').lower()
+
+
+def normalize_address(value):
+    """
+    Cleaned up, lowercase address with its domain typos fixed, and the
+    reason it cannot be used.
+
+    Returns:
+        (address, reason): reason is None for a valid address
+    """
+    address = _clean(value)
+    if not address:
+        return address, 'no email'
+    if address.count('@') > 1 or ',' in address or ';' in address:
+        return address, 'several addresses'
+
+    local, _, domain = address.rpartition('@')
+    domain = DOMAIN_TYPOS.get(domain, domain)
+    base, dot, tld = domain.rpartition('.')
+    if dot and tld in TLD_TYPOS:
+        domain = DOMAIN_TYPOS.get(f"{base}.com", f"{base}.com")
+    address = f"{local}@{domain}" if local else address
+
+    if (not _ADDRESS.fullmatch(address) or len(local) > 64
+            or len(address) > 254):
+        return address, 'malformed address'
+    return address, None
+
+
+class AddressCheck:
+    """
+    Recipient addresses of a roster, checked in one batch.
+
+    Args:
+        records: RosterRow records (see roster.py), in roster order
+        field: Field holding the email
+        name: Field holding the participant's name, for the report
+        suppressed: Set of addresses and @domains never to send to (see
+            load_suppression_list)
+
+    Attributes:
+        rows: Records with a usable address, with the field replaced by the
+            normalized address
+        fixed: (record, original value) of the addresses whose domain was
+            corrected
+        rejected: (record, reason) of the records left out
+    """
+
+    def __init__(self, records, field='email', name='name', suppressed=()):
+        self.field = field
+        self.name = name
+        self.rows = []
+        self.fixed = []
+        self.rejected = []
+
+        # Every distinct value is checked once
+        checked = {}
+        for record in records:
+            value = getattr(record, field)
+            result = checked.get(value)
+            if result is None:
+                address, reason = normalize_address(value)
+                if reason is None and (
+                    address in suppressed
+                    or '@' + address.rpartition('@')[2] in suppressed
+                ):
+                    reason = 'suppressed'
+                result = checked[value] = (address, reason)
+            address, reason = result
+            if reason is not None:
+                self.rejected.append((record, reason))
+                continue
+            if address != _clean(value):
+                self.fixed.append((record, value))
+            self.rows.append(record._replace(**{field: address}))
+
+    def report(self):
+        """Print the addresses fixed and the rows left out."""
+        if self.fixed:
+            print(f"✏️ {len(self.fixed)} addresses corrected:")
+            for record, value in self.fixed:
+                address, _ = normalize_address(value)
+                print(f"   - row {record.row_number}: {value.strip()} -> {address}")
+        if self.rejected:
+            print(f"⚠️ {len(self.rejected)} rows without a usable address skipped:")
+            for record, reason in self.rejected:
+                person = ' '.join(getattr(record, self.name).split())
+                value = getattr(record, self.field).strip()
+                print(f"   - row {record.row_number} ({person}): "
+                      f"{value or '-'} ({reason})")
@@ -0,0 +1,214 @@
+"""
+Concurrent sending engine for the certificate emails.
+
+An AsyncSender keeps `connections` authenticated SMTP sessions open (an
+SmtpPool) and runs the same number of asyncio workers. Each worker takes the
+next job from a bounded queue and runs it in a thread, so while one session
+waits for the server's reply the others keep sending. Throughput grows with
+the number of connections instead of being capped by the round-trip time of
+a single session. An optional RateLimiter (rate_limiter.py) decides when
+each message may go out.
+
+A job is a SendJob(key, send): `send(transport)` does the actual work for
+one recipient (find or render the certificate, build the message and send
+it over the given transport) and returns True on success or raises the
+error it got, like the send_certificate functions of the sending scripts.
+Failures are classified (see send_retry.py): with a RetryPolicy, transient
+ones go back to the queue after a backoff delay; a quota error stops the
+engine.
+"""
+import asyncio
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limiter import RateLimitExhausted
+from send_retry import classify
+from smtp_transport import SmtpPool
+
+
+# One recipient. key identifies it in the results (name, ledger id, ...)
+SendJob = namedtuple('SendJob', ['key', 'send'])
+
+# Final outcome of a job: ok is the value returned by send, error the
+# exception it raised (ok is False then), elapsed the seconds the last attempt
+# took, attempts how many times it was tried and outcome 'sent', 'transient',
+# 'quota', 'permanent', 'fatal' or 'pending' (see send_retry.classify)
+SendResult = namedtuple(
+    'SendResult', ['job', 'ok', 'error', 'elapsed', 'attempts', 'outcome']
+)
+
+
+class AsyncSender:
+    """
+    Send jobs over several SMTP connections at once.
+
+    Args:
+        transport_factory: Callable returning a new SmtpTransport
+        connections: Number of parallel SMTP sessions (and workers)
+        max_in_flight: Jobs queued ahead of the workers (default: two per
+            connection), so the job iterator never runs far ahead
+        limiter: Optional RateLimiter shared by all the connections; when
+            its budget runs out for longer than its max_wait the engine
+            stops and the remaining jobs are not sent
+        retry: Optional RetryPolicy; transient failures are retried up to
+            its max_attempts before being reported
+        pool: Optional ready pool used instead of an SmtpPool of
+            transport_factory, e.g. an AccountPool (accounts.py) sending
+            from several accounts; it is closed at the end of run()
+    """
+
+    def __init__(self, transport_factory, connections=1, max_in_flight=None,
+                 limiter=None, retry=None, pool=None):
+        if connections < 1:
+            raise ValueError("connections must be at least 1")
+        self.transport_factory = transport_factory
+        self.connections = connections
+        self.max_in_flight = max_in_flight or 2 * connections
+        self.limiter = limiter
+        self.retry = retry
+        self.pool = pool
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.stopped = False
+        self.attempts = {}
+        self._retry_tasks = set()
+
+    def stop(self):
+        """Stop taking new jobs; the ones already being sent finish."""
+        self.stopped = True
+        for task in self._retry_tasks:
+            task.cancel()
+        if hasattr(self.pool, 'stop'):
+            # Wake up the threads waiting inside the pool (AccountPool)
+            self.pool.stop()
+
+    async def _retry_later(self, queue, job, delay):
+        await asyncio.sleep(delay)
+        if not self.stopped:
+            await queue.put(job)
+
+    def _schedule_retry(self, queue, job, attempt, error):
+        delay = self.retry.delay(attempt)
+        print(f"🔁 Retrying {job.key} in {delay:.0f} s ({str(error)})")
+        self.retries += 1
+        task = asyncio.create_task(self._retry_later(queue, job, delay))
+        self._retry_tasks.add(task)
+        task.add_done_callback(self._retry_tasks.discard)
+
+    async def _process(self, job, queue, pool, executor, on_result):
+        if self.stopped:
+            return
+
+        if self.limiter:
+            try:
+                await self.limiter.acquire()
+            except RateLimitExhausted as e:
+                if not self.stopped:
+                    print(f"\n⚠️ Sending budget used up: {str(e)}")
+                    print("Run the script again later to continue.")
+                self.stop()
+                return
+            if self.stopped:
+                return
+
+        attempt = self.attempts.get(job.key, 0) + 1
+        self.attempts[job.key] = attempt
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            ok = bool(await loop.run_in_executor(executor, job.send, pool))
+            error = None
+        except Exception as e:
+            ok, error = False, e
+        elapsed = time.perf_counter() - start
+
+        outcome = 'sent' if ok else classify(error)
+        if (outcome == 'transient' and self.retry and not self.stopped
+                and attempt < self.retry.max_attempts):
+            self._schedule_retry(queue, job, attempt, error)
+            return
+        if outcome in ('quota', 'fatal'):
+            # Every other message would fail the same way
+            self.stop()
+
+        if ok:
+            self.sent += 1
+        else:
+            self.failed += 1
+        if on_result:
+            on_result(SendResult(job, ok, error, elapsed, attempt, outcome))
+
+    async def _worker(self, queue, pool, executor, on_result):
+        while True:
+            job = await queue.get()
+            try:
+                if job is None:
+                    return
+                await self._process(job, queue, pool, executor, on_result)
+            finally:
+                queue.task_done()
+
+    async def run(self, jobs, on_result=None):
+        """
+        Send every job and report each final outcome.
+
+        Args:
+            jobs: Iterable of SendJob, consumed lazily in a thread of its
+                own, so reading the roster and finding the certificates
+                never hold up the event loop. It must not update state that
+                on_result also updates.
+            on_result: Called with a SendResult once per job, after its last
+                attempt, in the event loop thread (so it can update shared
+                state safely). Jobs left waiting for a retry when the engine
+                stops are not reported.
+
+        Returns:
+            (sent, failed) counts
+        """
+        queue = asyncio.Queue(maxsize=self.max_in_flight)
+        # One thread per connection (the default executor may have fewer)
+        executor = ThreadPoolExecutor(max_workers=self.connections)
+        # The job iterator runs in one thread, so it is never entered twice
+        feeder = ThreadPoolExecutor(max_workers=1)
+        pool = self.pool or SmtpPool(self.transport_factory, size=self.connections)
+        loop = asyncio.get_running_loop()
+        try:
+            with executor, feeder, pool:
+                workers = [
+                    asyncio.create_task(self._worker(queue, pool, executor, on_result))
+                    for _ in range(self.connections)
+                ]
+                try:
+                    jobs = iter(jobs)
+                    while not self.stopped:
+                        job = await loop.run_in_executor(feeder, next, jobs, None)
+                        if job is None:
+                            break
+                        await queue.put(job)
+                    # Wait for the queued jobs and the retries they schedule
+                    while True:
+                        await queue.join()
+                        if not self._retry_tasks:
+                            break
+                        await asyncio.wait(set(self._retry_tasks))
+                except BaseException:
+                    # Ctrl+C or an error: let the workers finish quickly
+                    self.stop()
+                    raise
+                finally:
+                    for task in self._retry_tasks:
+                        task.cancel()
+                    for _ in workers:
+                        await queue.put(None)
+                    await asyncio.gather(*workers)
+        finally:
+            # The budgets used so far count even if the run was interrupted
+            if self.limiter:
+                self.limiter.save()
+        return self.sent, self.failed
+
+    def send_all(self, jobs, on_result=None):
+        """Blocking wrapper around run() for the sending scripts."""
+        return asyncio.run(self.run(jobs, on_result))
@@ -0,0 +1,183 @@
+"""
+End-to-end benchmark of the sending scripts against a local SMTP sink.
+
+Creates a synthetic roster and certificates in a temporary folder, points
+the script's config at an in-process SmtpSink (STARTTLS for the attendees
+script, SSL for the presenters one) and runs the script's main() once per
+number of connections. Reports messages per second, p50/p99 time per
+message, retries and what the sink saw (4xx/5xx answers, SMTP sessions).
+
+Usage:
+    python bench_send.py
+    python bench_send.py --script presentations --recipients 500 --connections 1,4,8
+    python bench_send.py --latency 0.2 --temp-fail-rate 0.02 --per-minute 600
+"""
+import argparse
+import contextlib
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from smtp_sink import SmtpSink
+
+SCRIPTS = {
+    'asistentes': ('send_certificates_asistentes', 'config_gmail', False),
+    'presentations': ('send_certificates_presentations', 'config_hostinger', True),
+}
+
+CONFIG = '''EMAIL_USER = "bench@localhost"
+EMAIL_PASSWORD = "bench"
+EMAIL_FROM = "Bench <bench@localhost>"
+REPLY_TO = "bench@localhost"
+SMTP_SERVER = "127.0.0.1"
+SMTP_PORT = {port}
+DOMAIN = "localhost"
+SEND_LIMIT_PER_MINUTE = {per_minute}
+SEND_LIMIT_PER_HOUR = None
+SEND_LIMIT_PER_DAY = None
+SEND_THROTTLE_COOLDOWN = {cooldown}
+SEND_RETRY_DELAY = {retry_delay}
+'''
+
+ASSISTANTS_TEMPLATE = '''SUBJECT = "Certificado de asistencia"
+BODY = "<html><body><p>Hola {attendee_name}, te enviamos tu certificado.</p></body></html>"
+'''
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def write_roster(script, module, recipients, attachment_kb):
+    """Synthetic roster and certificates at the paths the script reads."""
+    os.makedirs(module.CERTIFICATES_DIR, exist_ok=True)
+    os.makedirs(os.path.dirname(module.CSV_PATH), exist_ok=True)
+    certificate = os.urandom(attachment_kb * 1024)
+    with open(module.CSV_PATH, 'w', encoding='utf-8') as f:
+        if script == 'asistentes':
+            f.write("Marca temporal;Correo;País;Nombre y Apellido\n")
+        else:
+            f.write("TITULO,PRESENTADOR/A,AUTORES,MAIL\n")
+        for i in range(recipients):
+            name = f"Nombre{i} Apellido{i}"
+            email = f"persona{i}@example.com"
+            if script == 'asistentes':
+                f.write(f"2025-01-01;{email};Argentina;{name}\n")
+            else:
+                f.write(f"Trabajo {i},{name},Autor {i},{email}\n")
+            filename = f"certificado_{module.normalize_name(name)}.pdf"
+            with open(os.path.join(module.CERTIFICATES_DIR, filename), 'wb') as pdf:
+                pdf.write(certificate)
+
+
+def run_once(script, connections, args, workdir):
+    """Run the script once against a fresh sink and return its numbers."""
+    module_name, config_name, use_ssl = SCRIPTS[script]
+
+    sink = SmtpSink(
+        use_ssl=use_ssl, latency=args.latency, temp_fail_rate=args.temp_fail_rate,
+        reject_rate=args.reject_rate, seed=0,
+    )
+    with open(os.path.join(workdir, f"{config_name}.py"), 'w') as f:
+        f.write(CONFIG.format(
+            port=sink.port, per_minute=args.per_minute, cooldown=args.cooldown,
+            retry_delay=args.retry_delay,
+        ))
+    for name in (module_name, config_name, 'email_template_asistentes'):
+        sys.modules.pop(name, None)
+    module = importlib.import_module(module_name)
+
+    # Fresh ledger and rate limit state for every run
+    shutil.rmtree(os.path.join(workdir, 'congreso_neurociencias'), ignore_errors=True)
+    write_roster(script, module, args.recipients, args.attachment_kb)
+
+    results = []
+
+    class RecordingSender(module.AsyncSender):
+        def send_all(self, jobs, on_result=None):
+            def record(result):
+                results.append(result)
+                if on_result:
+                    on_result(result)
+            return super().send_all(jobs, record)
+
+    module.AsyncSender = RecordingSender
+    sys.argv = [module_name, '--connections', str(connections)]
+    with sink, open(os.devnull, 'w') as devnull:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(devnull):
+            module.main()
+        elapsed = time.perf_counter() - start
+
+    latencies = [r.elapsed for r in results]
+    return {
+        'connections': connections,
+        'sent': sum(r.ok for r in results),
+        'failed': sum(not r.ok for r in results),
+        'retries': sum(r.attempts - 1 for r in results),
+        'rate': len(results) / elapsed if elapsed else 0.0,
+        'p50': percentile(latencies, 0.50) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+        'temp_failures': sink.stats['temp_failures'],
+        'rejections': sink.stats['rejections'],
+        # One session is the script's initial connection test
+        'sessions': sink.stats['connections'] - 1,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument("--script", choices=[*SCRIPTS, 'both'], default='both')
+    parser.add_argument("--recipients", type=int, default=200)
+    parser.add_argument("--connections", default="1,2,4,8",
+                        help="comma-separated numbers of connections to try")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="seconds the sink takes to accept each message")
+    parser.add_argument("--temp-fail-rate", type=float, default=0.0)
+    parser.add_argument("--reject-rate", type=float, default=0.0)
+    parser.add_argument("--attachment-kb", type=int, default=60)
+    parser.add_argument("--per-minute", type=int, default=None,
+                        help="sending budget per minute (default: unlimited)")
+    parser.add_argument("--cooldown", type=float, default=1.0,
+                        help="pause after a 4xx answer (seconds)")
+    parser.add_argument("--retry-delay", type=float, default=0.5,
+                        help="delay before the first retry of a 4xx (seconds)")
+    args = parser.parse_args()
+
+    scripts = list(SCRIPTS) if args.script == 'both' else [args.script]
+    counts = [int(c) for c in args.connections.split(',')]
+
+    workdir = tempfile.mkdtemp(prefix='bench_send_')
+    cwd, path, argv = os.getcwd(), list(sys.path), sys.argv
+    repo = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(workdir, 'email_template_asistentes.py'), 'w') as f:
+        f.write(ASSISTANTS_TEMPLATE)
+    try:
+        os.chdir(workdir)
+        sys.path[:0] = [workdir, repo]
+        for script in scripts:
+            print(f"\n{script}: {args.recipients} recipients, "
+                  f"{args.latency * 1000:.0f} ms per message at the server")
+            print(f"{'conn':>4} {'sent':>6} {'failed':>6} {'retry':>6} {'msg/s':>8} "
+                  f"{'p50 ms':>8} {'p99 ms':>8} {'4xx':>5} {'5xx':>5} {'sessions':>8}")
+            for connections in counts:
+                r = run_once(script, connections, args, workdir)
+                print(f"{r['connections']:>4} {r['sent']:>6} {r['failed']:>6} {r['retries']:>6} "
+                      f"{r['rate']:>8.1f} {r['p50']:>8.1f} {r['p99']:>8.1f} "
+                      f"{r['temp_failures']:>5} {r['rejections']:>5} {r['sessions']:>8}")
+    finally:
+        os.chdir(cwd)
+        sys.path[:], sys.argv = path, argv
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Micro-benchmark for wrap_text and fit_text_to_box.
+
+Compares the original word-by-word wrapping (which re-measures the whole
+growing line for every word) with the current implementation, checks that
+both produce the same line breaks and prints the timings.
+
+Usage:
+    python bench_wrap_text.py
+    python bench_wrap_text.py "congreso_neurociencias/Presentadores Congreso.csv"
+"""
+import random
+import sys
+import time
+
+import pandas as pd
+from PIL import Image, ImageDraw, ImageFont
+
+from create_exposition_certificates import (
+    fit_text_to_box,
+    normalize_title_case,
+    wrap_text,
+)
+from render_assets import clear_font_cache, get_font
+
+
+FONT_PATH = "Automatization Example/D-DIN-Bold.ttf"
+MAX_WIDTH = 1700
+MAX_HEIGHT = 150
+START_SIZE = 40
+
+
+def legacy_wrap_text(text, font, max_width, draw):
+    """wrap_text as it was before the cumulative-width implementation."""
+    words = text.split()
+    lines = []
+    line = ""
+    for word in words:
+        test_line = line + word + " "
+        if draw.textlength(test_line, font=font) <= max_width:
+            line = test_line
+        else:
+            lines.append(line.strip())
+            line = word + " "
+    lines.append(line.strip())
+    return lines
+
+
+def legacy_fit_text_to_box(text, font_path, start_size, max_width, max_height, draw):
+    """fit_text_to_box as it was before the binary search."""
+    size = start_size
+    while size >= 10:
+        font = ImageFont.truetype(font_path, size)
+        lines = legacy_wrap_text(text, font, max_width, draw)
+        total_height = len(lines) * (font.size + 6) - 6
+        if total_height <= max_height:
+            return font, lines
+        size -= 1
+    font = ImageFont.truetype(font_path, 10)
+    return font, legacy_wrap_text(text, font, max_width, draw)
+
+
+def synthetic_titles(count=200, seed=0):
+    """Poster-like titles of 5 to 80 words."""
+    vocabulary = (
+        "efecto de la estimulación transcraneal sobre memoria de trabajo en "
+        "adultos mayores con deterioro cognitivo leve estudio longitudinal "
+        "aleatorizado neurofisiológico atención sostenida y control inhibitorio"
+    ).split()
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(vocabulary) for _ in range(rng.randint(5, 80)))
+        for _ in range(count)
+    ]
+
+
+def csv_titles(csv_path):
+    """Titles from the first column of a presenters CSV."""
+    df = pd.read_csv(csv_path)
+    return [normalize_title_case(t) for t in df.iloc[:, 0].dropna()]
+
+
+def run_wrap(label, wrap, titles, font, draw):
+    start = time.perf_counter()
+    results = [wrap(title, font, MAX_WIDTH, draw) for title in titles]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {elapsed * 1000:10.1f} ms  "
+          f"({elapsed / len(titles) * 1000:.2f} ms per title)")
+    return results, elapsed
+
+
+def run(label, fit, titles, draw):
+    start = time.perf_counter()
+    results = [
+        fit(title, FONT_PATH, START_SIZE, MAX_WIDTH, MAX_HEIGHT, draw)
+        for title in titles
+    ]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {elapsed * 1000:10.1f} ms  "
+          f"({elapsed / len(titles) * 1000:.2f} ms per title)")
+    return [(font.size, lines) for font, lines in results], elapsed
+
+
+def main():
+    titles = csv_titles(sys.argv[1]) if len(sys.argv) > 1 else synthetic_titles()
+    draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+
+    font = get_font(FONT_PATH, START_SIZE)
+    print(f"Wrapping {len(titles)} titles at {START_SIZE} pt")
+    legacy_lines, legacy_time = run_wrap("legacy", legacy_wrap_text, titles, font, draw)
+    lines, current_time = run_wrap("current", wrap_text, titles, font, draw)
+    print(f"Speedup: {legacy_time / current_time:.1f}x\n")
+
+    print(f"Fitting {len(titles)} titles into {MAX_WIDTH}x{MAX_HEIGHT} px")
+    legacy, legacy_time = run("legacy", legacy_fit_text_to_box, titles, draw)
+    clear_font_cache()
+    current, current_time = run("current", fit_text_to_box, titles, draw)
+
+    mismatches = sum(a != b for a, b in zip(legacy, current))
+    mismatches += sum(a != b for a, b in zip(legacy_lines, lines))
+    print(f"Speedup: {legacy_time / current_time:.1f}x")
+    if mismatches:
+        print(f"❌ {mismatches} titles wrapped differently")
+        sys.exit(1)
+    print("✅ Identical font sizes and line breaks")
+
+
+if __name__ == "__main__":
+    main()
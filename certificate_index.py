@@ -0,0 +1,110 @@
+"""
+Lookup index of the generated certificates.
+
+The sending scripts used to list the certificates folder and compare names
+by substring for every roster row. A CertificateIndex lists the folder once
+and keeps two maps:
+
+- exact: normalized name -> certificate paths
+- tokens: word -> names containing it, used as a fallback when a roster name
+  and a filename differ by extra or reordered words ("Ana Pérez" vs
+  "Ana María Pérez")
+
+A fallback that matches several certificates is reported as ambiguous
+instead of silently taking the first one.
+"""
+import os
+from collections import defaultdict, namedtuple
+
+PREFIX = 'certificado_'
+
+
+# Result of a lookup. path is None when nothing (or more than one
+# certificate) matched; candidates lists the paths that matched.
+Match = namedtuple('Match', ['path', 'kind', 'candidates'])
+
+
+def _default_normalize(name):
+    return name.lower()
+
+
+class CertificateIndex:
+    """
+    Index of the certificado_<name>.pdf files of a folder.
+
+    Args:
+        certificates_dir: Folder with the certificates
+        normalize: Function applied to roster names and to the names in the
+            filenames before comparing them (e.g. lowercase, no accents)
+    """
+
+    def __init__(self, certificates_dir, normalize=None):
+        self.certificates_dir = certificates_dir
+        self.normalize = normalize or _default_normalize
+        self.exact = defaultdict(list)
+        self.tokens = defaultdict(set)
+        self.key_tokens = {}
+
+        for filename in sorted(os.listdir(certificates_dir)):
+            if not filename.endswith('.pdf'):
+                continue
+            name = filename[:-4]
+            if name.startswith(PREFIX):
+                name = name[len(PREFIX):]
+            key = self.key(name)
+            self.exact[key].append(os.path.join(certificates_dir, filename))
+            words = frozenset(key.split())
+            self.key_tokens[key] = words
+            for word in words:
+                self.tokens[word].add(key)
+
+    def __len__(self):
+        return sum(len(paths) for paths in self.exact.values())
+
+    def key(self, name):
+        """Normalized name with single spaces."""
+        return ' '.join(self.normalize(name).split())
+
+    def lookup(self, name):
+        """
+        Find the certificate of a roster name.
+
+        Returns:
+            Match(path, kind, candidates). kind is 'exact', 'words' (every
+            word of one name appears in the other), 'ambiguous' (several
+            certificates match; path is None) or 'missing'.
+        """
+        key = self.key(name)
+        paths = self.exact.get(key)
+        if paths:
+            if len(paths) == 1:
+                return Match(paths[0], 'exact', paths)
+            return Match(None, 'ambiguous', paths)
+
+        words = frozenset(key.split())
+        if not words:
+            return Match(None, 'missing', [])
+
+        # Count, for every indexed name, how many of the query words it has
+        hits = defaultdict(int)
+        for word in words:
+            for candidate in self.tokens.get(word, ()):
+                hits[candidate] += 1
+
+        same_words = []
+        contained = []
+        for candidate, count in hits.items():
+            candidate_words = self.key_tokens[candidate]
+            if count == len(words) and count == len(candidate_words):
+                same_words.append(candidate)
+            elif count == len(words) or count == len(candidate_words):
+                contained.append(candidate)
+
+        # The same words in another order beat a partial match
+        for candidates in (same_words, contained):
+            paths = sorted(p for candidate in candidates for p in self.exact[candidate])
+            if len(paths) == 1:
+                return Match(paths[0], 'words', paths)
+            if paths:
+                return Match(None, 'ambiguous', paths)
+        return Match(None, 'missing', [])
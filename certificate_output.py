@@ -0,0 +1,342 @@
+"""
+Output backends for the certificate renderers.
+
+The renderers compute a layout (a list of TextRun) and hand it to an output
+backend together with the template:
+
+- RasterPdfOutput draws the text on a copy of the template and saves the
+  whole image as a PDF (the original behaviour).
+- VectorPdfOutput writes one PDF per certificate with the template as the
+  page background and the text as real text with an embedded font subset.
+- CombinedPdfOutput writes every certificate as a page of a single PDF, so
+  the background image is stored only once for the whole batch.
+
+RasterPdfOutput and VectorPdfOutput also accept a file-like object instead
+of a path; render_to_bytes uses that to keep the PDF in memory.
+
+The vector backends need reportlab (pip install reportlab).
+"""
+import argparse
+import hashlib
+import io
+import os
+import tempfile
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from PIL import ImageColor, ImageDraw
+
+from render_assets import get_font, load_template, template_size
+
+try:
+    from reportlab import rl_config
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    # Embed images as binary streams; ASCII85 makes them 25% bigger and is
+    # encoded in pure Python for every file.
+    rl_config.useA85 = 0
+except ImportError:  # only needed by the vector backends
+    canvas = None
+
+
+# One piece of text placed on the certificate. xy is the top-left corner as
+# used by ImageDraw.text, font comes from render_assets.get_font.
+TextRun = namedtuple('TextRun', ['text', 'xy', 'font', 'fill'])
+
+# Color reductions supported by the backends. There is no palette mode: PIL
+# stores paletted images in PDFs as uncompressed ASCIIHex, which makes the
+# files bigger instead of smaller.
+COLOR_MODES = ('rgb', 'gray')
+
+# JPEG qualities above 95 only make the files bigger
+MAX_QUALITY = 95
+
+
+def check_options(scale=1.0, quality=None, color='rgb'):
+    """Raise ValueError for output options out of range."""
+    if not 0 < scale <= 1:
+        raise ValueError(f"scale must be > 0 and <= 1, got {scale}")
+    if quality is not None and not 1 <= quality <= MAX_QUALITY:
+        raise ValueError(f"quality must be between 1 and {MAX_QUALITY}, got {quality}")
+    if color not in COLOR_MODES:
+        raise ValueError(f"Unknown color mode '{color}'")
+
+
+class RasterPdfOutput:
+    """
+    Draw the text on the template and save the full image as a PDF.
+
+    Args:
+        scale: Downscale factor for the saved image (e.g. 0.5). The PDF page
+            keeps its physical size, only the image resolution drops.
+        quality: JPEG quality of the image inside the PDF (PIL's default
+            of 75 if None)
+        color: 'rgb' (template colors) or 'gray'
+    """
+
+    def __init__(self, scale=1.0, quality=None, color='rgb'):
+        check_options(scale, quality, color)
+        self.scale = scale
+        self.quality = quality
+        self.color = color
+        self.options = {'scale': scale, 'quality': quality, 'color': color}
+
+    def write(self, certificate_template, runs, path):
+        # Grayscale and downscaling are applied once, on the cached template;
+        # the text is then drawn directly at the reduced size
+        mode = 'L' if self.color == 'gray' else None
+        im = load_template(certificate_template, mode, self.scale)
+        draw = ImageDraw.Draw(im)
+        for run in runs:
+            x, y = run.xy
+            font = run.font
+            if self.scale != 1:
+                x, y = x * self.scale, y * self.scale
+                font = get_font(font.path, max(1, round(font.size * self.scale)))
+            draw.text((x, y), run.text, fill=run.fill, font=font)
+
+        # PIL writes PDFs at 72 dpi by default (one pixel per point); the
+        # resolution keeps the page size when the image is downscaled
+        options = {'resolution': 72.0 * self.scale}
+        if self.quality is not None:
+            options['quality'] = self.quality
+        im.save(path, 'PDF', **options)
+
+    def close(self):
+        pass
+
+
+@lru_cache(maxsize=None)
+def _background_path(certificate_template, scale=1.0, quality=None, gray=False):
+    """
+    Return a JPEG version of the template that reportlab can embed as is.
+
+    JPEG templates without any option are used directly. Otherwise the
+    template is converted once to a JPEG in the temp directory (keyed by
+    path, modification time and options, so it is shared by worker
+    processes and later runs) instead of reportlab re-compressing the raw
+    pixels for every file. The default quality of 75 is what PIL uses for
+    the backgrounds of the raster PDFs.
+    """
+    is_jpeg = os.path.splitext(certificate_template)[1].lower() in ('.jpg', '.jpeg')
+    if is_jpeg and scale == 1 and quality is None and not gray:
+        return certificate_template
+    stat = os.stat(certificate_template)
+    key = hashlib.sha1(
+        f"{os.path.abspath(certificate_template)}:{stat.st_mtime_ns}:"
+        f"{scale}:{quality}:{gray}".encode()
+    ).hexdigest()[:16]
+    path = os.path.join(tempfile.gettempdir(), f"certificate_background_{key}.jpg")
+    if not os.path.exists(path):
+        im = load_template(certificate_template, 'L' if gray else 'RGB', scale)
+        fd, tmp_path = tempfile.mkstemp(suffix='.jpg', dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            im.save(f, 'JPEG', quality=75 if quality is None else quality)
+        os.replace(tmp_path, path)
+    return path
+
+
+@lru_cache(maxsize=None)
+def _pdf_font_name(font_path):
+    """Register a TrueType font with reportlab once and return its name."""
+    name = os.path.splitext(os.path.basename(font_path))[0]
+    pdfmetrics.registerFont(TTFont(name, font_path))
+    return name
+
+
+def _draw_page(pdf, certificate_template, runs, background_options):
+    """Draw the background and the text runs on the current PDF page."""
+    width, height = template_size(certificate_template)
+    pdf.setPageSize((width, height))
+    background = _background_path(certificate_template, **background_options)
+    pdf.drawImage(background, 0, 0, width, height)
+    for run in runs:
+        ascent, _ = run.font.getmetrics()
+        red, green, blue = ImageColor.getrgb(run.fill)[:3]
+        pdf.setFillColorRGB(red / 255, green / 255, blue / 255)
+        pdf.setFont(_pdf_font_name(run.font.path), run.font.size)
+        # ImageDraw places the top of the text at y; PDF draws on the
+        # baseline and measures y from the bottom of the page.
+        x, y = run.xy
+        pdf.drawString(x, height - y - ascent, run.text)
+    pdf.showPage()
+
+
+def _require_reportlab():
+    if canvas is None:
+        raise ImportError(
+            "reportlab is required for vector PDF output: pip install reportlab"
+        )
+
+
+def _background_options(scale, quality, color):
+    """Options of the background image for the vector backends."""
+    check_options(scale, quality, color)
+    return {'scale': scale, 'quality': quality, 'gray': color == 'gray'}
+
+
+class VectorPdfOutput:
+    """
+    One PDF per certificate with the template as background and real text.
+
+    scale, quality and color ('rgb' or 'gray') apply to the background image,
+    as in RasterPdfOutput.
+    """
+
+    def __init__(self, scale=1.0, quality=None, color='rgb'):
+        _require_reportlab()
+        self.options = _background_options(scale, quality, color)
+
+    def write(self, certificate_template, runs, path):
+        pdf = canvas.Canvas(path)
+        _draw_page(pdf, certificate_template, runs, self.options)
+        pdf.save()
+
+    def close(self):
+        pass
+
+
+class CombinedPdfOutput:
+    """
+    Every certificate as a page of a single PDF.
+
+    The path given to write() is only used as the page's bookmark title.
+    scale, quality and color work as in VectorPdfOutput.
+    """
+
+    def __init__(self, path, scale=1.0, quality=None, color='rgb'):
+        _require_reportlab()
+        self.path = path
+        self.options = _background_options(scale, quality, color)
+        self.pdf = canvas.Canvas(path)
+        self.pages = 0
+
+    def write(self, certificate_template, runs, path):
+        title = os.path.splitext(os.path.basename(path))[0]
+        key = f"page{self.pages}"
+        self.pdf.bookmarkPage(key)
+        self.pdf.addOutlineEntry(title, key)
+        _draw_page(self.pdf, certificate_template, runs, self.options)
+        self.pages += 1
+
+    def close(self):
+        self.pdf.save()
+
+
+def render_to_bytes(output, certificate_template, runs):
+    """
+    Render a certificate in memory with a per-file backend.
+
+    Returns:
+        The PDF as bytes, without writing anything to disk
+    """
+    buffer = io.BytesIO()
+    output.write(certificate_template, runs, buffer)
+    return buffer.getvalue()
+
+
+class OutputStats:
+    """Average file size and time per certificate of a run."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.count = 0
+        self.total_bytes = 0
+        self.files = 0
+
+    def add(self, path=None, size=None):
+        """Count one certificate; its size is read from path if not given."""
+        self.count += 1
+        if size is None and path and os.path.exists(path):
+            size = os.path.getsize(path)
+        if size is not None:
+            self.total_bytes += size
+            self.files += 1
+
+    def add_file(self, path):
+        """Count the size of a file holding several certificates."""
+        if os.path.exists(path):
+            self.total_bytes += os.path.getsize(path)
+            self.files += 1
+
+    def report(self):
+        if not self.count:
+            return
+        elapsed = time.perf_counter() - self.start
+        print(f"Time per certificate: {elapsed / self.count * 1000:.0f} ms")
+        if self.files:
+            print(f"Average file size: {self.total_bytes / self.files / 1024:.1f} KB")
+
+
+def make_output(kind, combined_path=None, **options):
+    """
+    Create an output backend by name.
+
+    Args:
+        kind: 'raster', 'vector' or 'combined'
+        combined_path: Path of the single PDF written by 'combined'
+        **options: scale, quality and color for the backend
+
+    Returns:
+        The output backend
+    """
+    if kind == 'raster':
+        return RasterPdfOutput(**options)
+    if kind == 'vector':
+        return VectorPdfOutput(**options)
+    if kind == 'combined':
+        return CombinedPdfOutput(combined_path, **options)
+    raise ValueError(f"Unknown output '{kind}'")
+
+
+def _scale_argument(value):
+    try:
+        scale = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a number: {value}")
+    if not 0 < scale <= 1:
+        raise argparse.ArgumentTypeError(f"must be > 0 and <= 1, got {value}")
+    return scale
+
+
+def _quality_argument(value):
+    try:
+        quality = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a whole number: {value}")
+    if not 1 <= quality <= MAX_QUALITY:
+        raise argparse.ArgumentTypeError(
+            f"must be between 1 and {MAX_QUALITY}, got {value}"
+        )
+    return quality
+
+
+def add_output_arguments(parser):
+    """Add the --output, --scale, --quality and --color options to a parser."""
+    parser.add_argument(
+        "--output", choices=["raster", "vector", "combined"], default="raster",
+        help="raster: full-image PDFs (default); vector: template background "
+             "with real text; combined: one multi-page PDF for the whole batch",
+    )
+    parser.add_argument(
+        "--scale", type=_scale_argument, default=1.0,
+        help="downscale factor of the image inside the PDFs, e.g. 0.5 "
+             "(above 0, at most 1)",
+    )
+    parser.add_argument(
+        "--quality", type=_quality_argument, default=None,
+        help=f"JPEG quality of the image inside the PDFs, 1-{MAX_QUALITY} "
+             "(default: 75)",
+    )
+    parser.add_argument(
+        "--color", choices=COLOR_MODES, default="rgb",
+        help="rgb (default) or gray",
+    )
+
+
+def output_options(args):
+    """Backend options from the arguments added by add_output_arguments."""
+    return {'scale': args.scale, 'quality': args.quality, 'color': args.color}
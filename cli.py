@@ -0,0 +1,41 @@
+"""
+Command-line options of the sending scripts.
+
+The sending scripts read their options straight from sys.argv
+(e.g. --connections 4). These helpers read one option and stop the script
+with a clear message when its value is missing or not valid, instead of a
+traceback.
+"""
+import sys
+
+
+def option_value(option, default, argv=None):
+    """Value given after a command-line option, e.g. --connections 4."""
+    argv = sys.argv if argv is None else argv
+    if option not in argv[1:]:
+        return default
+    position = argv.index(option, 1)
+    if position == len(argv) - 1:
+        sys.exit(f"❌ {option} needs a value")
+    return argv[position + 1]
+
+
+def int_option(option, default, minimum=0, argv=None):
+    """Whole number given after option, at least minimum."""
+    value = option_value(option, default, argv)
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = None
+    if number is None or number < minimum:
+        sys.exit(f"❌ {option} expects a whole number of at least {minimum}, "
+                 f"got '{value}'")
+    return number
+
+
+def choice_option(option, default, choices, argv=None):
+    """Value given after option, one of choices."""
+    value = option_value(option, default, argv)
+    if value not in choices:
+        sys.exit(f"❌ {option} expects one of {', '.join(choices)}, got '{value}'")
+    return value
@@ -1,7 +1,29 @@
+import argparse
 import os
-import pandas as pd
-from PIL import Image, ImageDraw, ImageFont
-from utils import eliminate_accents
+from itertools import islice
+from multiprocessing import Pool
+
+from certificate_output import (
+    OutputStats,
+    RasterPdfOutput,
+    TextRun,
+    add_output_arguments,
+    make_output,
+    output_options,
+    render_to_bytes,
+)
+from render_assets import (
+    get_font,
+    load_template,
+    measuring_draw,
+    template_size,
+    text_length,
+)
+from render_manifest import RenderManifest, certificate_fingerprint
+from names import name_keys
+from roster import load_roster
+from roster_check import RosterCheck
+from utils import certificate_filename
 
 
 def capitalize_name(name):
@@ -12,32 +34,49 @@ def capitalize_name(name):
         name: The name to capitalize
         
     Returns:
-        The capitalized name
+        The capitalized name (see names.display_name)
     """
     # Skip if name is not a string
     if not isinstance(name, str):
         return name
-        
-    # Split the name by spaces and capitalize each part
-    words = name.split()
-    capitalized_words = []
+    return name_keys(name).display
+
+
+def adjusted_font_size(assistant_name, font_size):
+    """Reduce the base font size for long names."""
+    if len(assistant_name) > 40:
+        return int(font_size * 0.8)
+    elif len(assistant_name) > 35:
+        return int(font_size * 0.9)
+    return font_size
+
+
+def assistant_certificate_layout(
+    certificate_template,
+    assistant_name,
+    text_color,
+    font_path,
+    font_size,
+):
+    """
+    Compute where the assistant's name goes on the certificate.
     
-    for word in words:
-        # Handle empty words
-        if not word:
-            capitalized_words.append(word)
-            continue
-            
-        # Handle words with special characters at the beginning
-        if not word[0].isalpha():
-            capitalized_words.append(word)
-            continue
-            
-        # Capitalize the first letter and keep the rest as is
-        capitalized_words.append(word[0].upper() + word[1:])
+    Returns:
+        runs: List of TextRun to hand to an output backend
+    """
+    # Load the font
+    font = get_font(font_path, adjusted_font_size(assistant_name, font_size))
+    
+    # Measure against the template without copying it
+    width, height = template_size(certificate_template)
+    draw = measuring_draw(certificate_template)
     
-    # Join the words back together
-    return " ".join(capitalized_words)
+    # Center the text
+    text_width = text_length(draw, assistant_name, font)
+    x = (width - text_width) / 2
+    y = 350  # Vertical position for the name
+    
+    return [TextRun(assistant_name, (x, y), font, text_color)]
 
 
 def create_assistant_certificate(
@@ -47,6 +86,8 @@ def create_assistant_certificate(
     font_path,
     font_size,
     save_path='',
+    output=None,
+    filename=None,
 ):
     """
     Create a certificate for an assistant of the congress.
@@ -58,70 +99,220 @@ def create_assistant_certificate(
         font_path: Path to the font file
         font_size: Base font size for the name
         save_path: Directory to save the certificate
+        output: Output backend from certificate_output (raster PDF if None)
+        filename: Filename to save with (see roster_check), by default
+            certificado_<name>.pdf
     
     Returns:
         filename: Name of the saved certificate file
     """
-    # Load the font
-    # Adjust font size based on name length
-    adjusted_size = font_size
-    if len(assistant_name) > 40:
-        adjusted_size = int(font_size * 0.8)
-    elif len(assistant_name) > 35:
-        adjusted_size = int(font_size * 0.9)
-    
-    font = ImageFont.truetype(font_path, adjusted_size)
-    
-    # Open image and prepare drawing
-    im = Image.open(certificate_template)
-    width, height = im.size
-    draw = ImageDraw.Draw(im)
-    
-    # Center the text
-    text_width = draw.textlength(assistant_name, font=font)
-    x = (width - text_width) / 2
-    y = 350  # Vertical position for the name
-    
-    # Draw the name
-    draw.text((x, y), assistant_name, fill=text_color, font=font)
+    runs = assistant_certificate_layout(
+        certificate_template, assistant_name, text_color, font_path, font_size
+    )
     
     # Save certificate
-    filename = f'certificado_{eliminate_accents(assistant_name)}.pdf'
-    im.save(os.path.join(save_path, filename))
+    filename = filename or certificate_filename(assistant_name)
+    output = output or RasterPdfOutput()
+    output.write(certificate_template, runs, os.path.join(save_path, filename))
     return filename
 
 
+def render_assistant_certificate(
+    certificate_template,
+    assistant_name,
+    text_color,
+    font_path,
+    font_size,
+    output=None,
+    filename=None,
+):
+    """
+    Render an assistant's certificate in memory instead of saving it.
+    
+    Args:
+        Same as create_assistant_certificate, without save_path. output must
+        be a per-file backend (raster or vector).
+    
+    Returns:
+        (filename, pdf_bytes): Name the certificate would be saved with and
+        the PDF content
+    """
+    runs = assistant_certificate_layout(
+        certificate_template, assistant_name, text_color, font_path, font_size
+    )
+    pdf_bytes = render_to_bytes(
+        output or RasterPdfOutput(), certificate_template, runs
+    )
+    return filename or certificate_filename(assistant_name), pdf_bytes
+
+
+def congress_settings(folder_path="congreso_neurociencias"):
+    """
+    Template, font and color of the congress assistant certificates, as
+    keyword arguments for create_assistant_certificate.
+    """
+    font_dir = os.path.join(folder_path, "nunito-sans")
+    return {
+        'certificate_template': os.path.join(folder_path, "certificate_asistente.png"),
+        'text_color': "#000000",
+        'font_path': os.path.join(font_dir, "NunitoSans-Bold.ttf"),
+        'font_size': 80,
+    }
+
+
+# Settings shared by every certificate rendered in this process
+_render_settings = {}
+
+
+def _init_renderer(settings):
+    """
+    Prepare a rendering process: keep the settings and load the template and
+    fonts once so every certificate afterwards reuses them.
+    """
+    _render_settings.clear()
+    _render_settings.update(settings)
+    load_template(settings['certificate_template'])
+    base_size = settings['font_size']
+    for size in {base_size, int(base_size * 0.8), int(base_size * 0.9)}:
+        get_font(settings['font_path'], size)
+
+
+def _render_assistant(job):
+    """Render one (row_number, assistant_name, filename) job, never raising."""
+    row_number, assistant_name, filename = job
+    try:
+        filename = create_assistant_certificate(
+            assistant_name=assistant_name, filename=filename, **_render_settings
+        )
+        return row_number, assistant_name, filename, None
+    except Exception as e:
+        return row_number, assistant_name, None, str(e)
+
+
+def iter_assistant_jobs(csv_path, name_column, email_column=None):
+    """
+    (row_number, assistant_name, filename) jobs from the registration CSV,
+    skipping empty names and capitalizing the rest.
+
+    Duplicate registrations (same name and email) are rendered once, and
+    different names sharing a filename get one file each (see
+    roster_check); both are reported before rendering. That check needs
+    every row first, so the projected roster is loaded whole instead of
+    streamed.
+    """
+    columns = {'name': name_column}
+    if email_column is not None:
+        columns['email'] = email_column
+    # Display names and filename keys of the whole roster in one pass
+    check = RosterCheck(
+        load_roster(csv_path, columns),
+        email='email' if email_column is not None else None,
+    )
+    check.report()
+    for record, filename in check.certificates():
+        if filename is None:
+            print(f"⚠️ Skipping empty name at row {record.row_number}")
+            continue
+        yield record.row_number, capitalize_name(record.name), filename
+
+
+def assistant_fingerprint(assistant_name, settings):
+    """Fingerprint of everything that goes into an assistant's certificate."""
+    params = {
+        key: value for key, value in settings.items()
+        if key not in ('save_path', 'output')
+    }
+    output = settings['output']
+    params['output'] = [type(output).__name__, getattr(output, 'options', {})]
+    return certificate_fingerprint(
+        {'name': assistant_name},
+        [settings['certificate_template'], settings['font_path']],
+        params,
+    )
+
+
+def iter_changed_jobs(jobs, settings, manifest, fingerprints, skipped, force=False):
+    """
+    Drop the jobs whose certificate is already up to date in the manifest.
+
+    The fingerprint of every job that is kept is stored in fingerprints
+    (keyed by row number) so it can be recorded once the PDF is rendered;
+    the names of the skipped jobs are appended to skipped.
+    """
+    for row_number, assistant_name, filename in jobs:
+        fingerprint = assistant_fingerprint(assistant_name, settings)
+        if manifest.is_current(filename, fingerprint) and not force:
+            skipped.append(assistant_name)
+            continue
+        fingerprints[row_number] = fingerprint
+        yield row_number, assistant_name, filename
+
+
+def render_assistant_certificates(jobs, settings, workers=1, batch_size=512):
+    """
+    Render certificates for many assistants.
+
+    Args:
+        jobs: Iterable of (row_number, assistant_name, filename) tuples,
+            consumed lazily
+        settings: Keyword arguments for create_assistant_certificate
+            (everything except assistant_name)
+        workers: Number of processes; 1 renders in the current process
+        batch_size: Jobs handed to the pool at a time, which bounds memory
+
+    Yields:
+        (row_number, assistant_name, filename, error) in the same order as
+        jobs; filename is None and error holds the message on failure
+    """
+    if workers <= 1:
+        _init_renderer(settings)
+        yield from map(_render_assistant, jobs)
+        return
+
+    # Load the template and fonts here first: if one is missing the error is
+    # raised in this process, instead of every worker failing in the pool
+    # initializer and the pool replacing them forever
+    _init_renderer(settings)
+    jobs = iter(jobs)
+    with Pool(workers, initializer=_init_renderer, initargs=(settings,)) as pool:
+        while True:
+            batch = list(islice(jobs, batch_size))
+            if not batch:
+                break
+            yield from pool.imap(_render_assistant, batch, chunksize=16)
+
+
 # === MAIN ===
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Create certificates for the congress assistants."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="number of processes used to render certificates (default: 1)",
+    )
+    add_output_arguments(parser)
+    parser.add_argument(
+        "--force", action="store_true",
+        help="render every certificate, even the ones that did not change",
+    )
+    args = parser.parse_args()
+    if args.output == "combined" and args.workers > 1:
+        parser.error("--output combined writes a single file, use --workers 1")
+
     # Configuration
     folder_path = "congreso_neurociencias"
-    certificate_template = os.path.join(
-        folder_path, "certificate_asistente.png"
-    )
     
     # CSV with registration data
     csv_file = "Inscripción al Primer Congreso Latinoamericano de Neurociencias Cognitivas  (respuestas) - Respuestas de formulario.csv"
     csv_path = os.path.join(folder_path, csv_file)
     
-    # Font settings
-    font_dir = os.path.join(folder_path, "nunito-sans")
-    bold_font = os.path.join(font_dir, "NunitoSans-Bold.ttf")
-    
     # Output folder
     certificate_folder = os.path.join(folder_path, "certificados_asistentes")
     os.makedirs(certificate_folder, exist_ok=True)
     
-    # Text color
-    text_color = "#000000"
-    
-    # Font size
-    name_font_size = 80
-    
     # Process all names from the CSV
     try:
-        # Read CSV file
-        df = pd.read_csv(csv_path)
-        
         # Column with participant names
         name_column = "Nombre y Apellido"
         
@@ -129,40 +320,71 @@ if __name__ == "__main__":
         success_count = 0
         error_count = 0
         
-        # Iterate through all names
-        for idx, row in df.iterrows():
-            # Get the name from the CSV
-            original_name = row[name_column]
-            
-            # Check if name is valid
-            if pd.isna(original_name) or not original_name:
-                print(f"⚠️ Skipping empty name at row {idx+1}")
-                continue
-            
-            # Capitalize the name
-            assistant_name = capitalize_name(original_name)
-                
-            try:
-                filename = create_assistant_certificate(
-                    certificate_template=certificate_template,
-                    assistant_name=assistant_name,
-                    text_color=text_color,
-                    font_path=bold_font,
-                    font_size=name_font_size,
-                    save_path=certificate_folder
-                )
+        # Template, font, color and size
+        settings = {
+            **congress_settings(folder_path),
+            'save_path': certificate_folder,
+            'output': make_output(
+                args.output,
+                os.path.join(certificate_folder, "certificados_asistentes.pdf"),
+                **output_options(args),
+            ),
+        }
+        
+        # Valid names from the CSV, without duplicate registrations; the
+        # email is the second column, as in the send script
+        jobs = iter_assistant_jobs(csv_path, name_column, email_column=1)
+        
+        # Only render new or changed certificates (a combined PDF is always
+        # rebuilt as a whole)
+        manifest = RenderManifest(certificate_folder)
+        fingerprints = {}
+        skipped = []
+        if args.output != "combined":
+            jobs = iter_changed_jobs(
+                jobs, settings, manifest, fingerprints, skipped, force=args.force
+            )
+        
+        # Results come back in the same order as the CSV rows
+        stats = OutputStats()
+        for row_number, assistant_name, filename, error in render_assistant_certificates(
+            jobs, settings, workers=args.workers
+        ):
+            if error is None:
                 print(f"✅ Certificate created: {filename}")
                 success_count += 1
-            except Exception as e:
+                if args.output == "combined":
+                    # Only a page of the combined PDF, counted once below; a
+                    # file with this name can only be left from another run
+                    stats.add()
+                else:
+                    stats.add(os.path.join(certificate_folder, filename))
+                if row_number in fingerprints:
+                    manifest.record(filename, fingerprints.pop(row_number))
+            else:
                 err_msg = f"❌ Error creating certificate for {assistant_name}"
-                print(f"{err_msg}: {str(e)}")
+                print(f"{err_msg}: {error}")
                 error_count += 1
+        settings['output'].close()
+        if args.output == "combined":
+            stats.add_file(settings['output'].path)
+        stale = []
+        if args.output != "combined":
+            stale = manifest.stale()
+            manifest.save()
         
         # Print summary
         print("\n=== SUMMARY ===")
         print(f"Total certificates created: {success_count}")
+        print(f"Unchanged (skipped): {len(skipped)}")
         print(f"Failed certificates: {error_count}")
-        print(f"Total processed: {success_count + error_count}")
+        print(f"Total processed: {success_count + error_count + len(skipped)}")
+        stats.report()
+        
+        if stale:
+            print("\nCertificates no longer in the CSV (not deleted):")
+            for filename in stale:
+                print(f"- {filename}")
         
     except Exception as e:
-        print(f"❌ Error processing CSV file: {str(e)}") 
\ No newline at end of file
+        print(f"❌ Error processing CSV file: {str(e)}") 
@@ -1,38 +1,87 @@
+import argparse
 import os
-import pandas as pd
-from PIL import Image, ImageDraw, ImageFont
-from utils import eliminate_accents
+from bisect import bisect_right
+from certificate_output import (
+    OutputStats,
+    RasterPdfOutput,
+    TextRun,
+    add_output_arguments,
+    make_output,
+    output_options,
+    render_to_bytes,
+)
+from render_assets import get_font, measuring_draw, template_size, text_length
+from render_manifest import RenderManifest, certificate_fingerprint
+from roster import load_roster
+from roster_check import RosterCheck
+from utils import certificate_filename
 
 
 def wrap_text(text, font, max_width, draw):
+    """
+    Parte el texto en líneas de como máximo max_width píxeles.
+
+    Cada palabra y el espacio se miden una sola vez por fuente; el corte de
+    cada línea se estima con los anchos acumulados y sólo se mide la línea
+    completa alrededor del corte (para respetar el kerning). Da los mismos
+    cortes que agregar palabra por palabra midiendo "línea + palabra + ' '".
+    """
     words = text.split()
-    lines = []
-    line = ""
+    if not words:
+        return [""]
+
+    space_width = text_length(draw, " ", font)
+    # cumulative[i] = ancho estimado de "w0 w1 ... w(i-1) "
+    cumulative = [0]
     for word in words:
-        test_line = line + word + " "
-        if draw.textlength(test_line, font=font) <= max_width:
-            line = test_line
-        else:
-            lines.append(line.strip())
-            line = word + " "
-    lines.append(line.strip())
+        cumulative.append(cumulative[-1] + text_length(draw, word, font) + space_width)
+
+    def fits(start, end):
+        return text_length(draw, " ".join(words[start:end]) + " ", font) <= max_width
+
+    lines = []
+    start = 0
+    # La primera línea puede quedar vacía si la primera palabra no entra;
+    # las siguientes siempre arrancan con la palabra que desbordó la anterior.
+    min_words = 0
+    while start < len(words):
+        end = bisect_right(cumulative, cumulative[start] + max_width) - 1
+        end = min(max(end, start + min_words), len(words))
+        while end > start + min_words and not fits(start, end):
+            end -= 1
+        while end < len(words) and fits(start, end + 1):
+            end += 1
+        lines.append(" ".join(words[start:end]))
+        start = end
+        min_words = 1
     return lines
 
 
 def fit_text_to_box(text, font_path, start_size, max_width, max_height, draw):
     """
-    Reduce el tamaño de fuente y ajusta el texto en líneas hasta que quepa en el área disponible.
+    Busca el mayor tamaño de fuente (entre 10 y start_size) con el que el texto,
+    ajustado en líneas, cabe en el área disponible.
+
+    La altura del bloque crece con el tamaño de fuente, así que una búsqueda
+    binaria da el mismo resultado que bajar de a un punto, en log2(start_size)
+    pasos en lugar de start_size.
     """
-    size = start_size
-    while size >= 10:
-        font = ImageFont.truetype(font_path, size)
+    best = None
+    low, high = 10, start_size
+    while low <= high:
+        size = (low + high) // 2
+        font = get_font(font_path, size)
         lines = wrap_text(text, font, max_width, draw)
         total_height = len(lines) * (font.size + 6) - 6
         if total_height <= max_height:
-            return font, lines
-        size -= 1
+            best = font, lines
+            low = size + 1
+        else:
+            high = size - 1
+    if best is not None:
+        return best
     # fallback si no entra nunca
-    font = ImageFont.truetype(font_path, 10)
+    font = get_font(font_path, 10)
     return font, wrap_text(text, font, max_width, draw)
 
 
@@ -48,7 +97,7 @@ def normalize_title_case(text):
     return text
 
 
-def create_exposition_certificate(
+def exposition_certificate_layout(
     certificate_template,
     expositor_name,
     title,
@@ -60,17 +109,22 @@ def create_exposition_certificate(
     expositor_size,
     title_size,
     authors_size,
-    save_path='',
     width=None,
 ):
-    expositor_font = ImageFont.truetype(bold_font_path, expositor_size)
-    im = Image.open(certificate_template)
-    draw = ImageDraw.Draw(im)
+    """
+    Calcula la posición del nombre, el título y los autores en el certificado.
+
+    Devuelve la lista de TextRun para pasarle a un backend de salida.
+    """
+    expositor_font = get_font(bold_font_path, expositor_size)
+    # Se mide contra el template sin copiarlo; el texto se acumula en runs
+    draw = measuring_draw(certificate_template)
+    runs = []
 
     def center_text(text, y, font):
-        text_width = draw.textlength(text, font=font)
+        text_width = text_length(draw, text, font)
         x = (width - text_width) / 2
-        draw.text((x, y), text, fill=text_color, font=font)
+        runs.append(TextRun(text, (x, y), font, text_color))
 
     # --- Posiciones generales ---
     y_start = 350  # debajo de "Se certifica que"
@@ -101,66 +155,210 @@ def create_exposition_certificate(
         y = y_authors_start + i * (authors_font.size + line_spacing)
         center_text(line, y, authors_font)
 
-    # Guardar
-    filename = f'certificado_{eliminate_accents(expositor_name)}.pdf'
-    im.save(os.path.join(save_path, filename))
+    return runs
+
+
+def create_exposition_certificate(
+    certificate_template,
+    expositor_name,
+    title,
+    authors,
+    text_color,
+    regular_font_path,
+    bold_font_path,
+    italic_font_path,
+    expositor_size,
+    title_size,
+    authors_size,
+    save_path='',
+    width=None,
+    output=None,
+    filename=None,
+):
+    runs = exposition_certificate_layout(
+        certificate_template, expositor_name, title, authors, text_color,
+        regular_font_path, bold_font_path, italic_font_path,
+        expositor_size, title_size, authors_size, width=width,
+    )
+
+    # Guardar (con el nombre desambiguado de roster_check si hace falta)
+    filename = filename or certificate_filename(expositor_name)
+    output = output or RasterPdfOutput()
+    output.write(certificate_template, runs, os.path.join(save_path, filename))
     return filename
 
 
+def render_exposition_certificate(
+    certificate_template,
+    expositor_name,
+    title,
+    authors,
+    text_color,
+    regular_font_path,
+    bold_font_path,
+    italic_font_path,
+    expositor_size,
+    title_size,
+    authors_size,
+    width=None,
+    output=None,
+    filename=None,
+):
+    """
+    Crea el certificado en memoria en lugar de guardarlo.
+
+    Devuelve (filename, pdf_bytes): el nombre con el que se guardaría y el
+    contenido del PDF. output tiene que ser un backend por archivo (raster
+    o vector).
+    """
+    runs = exposition_certificate_layout(
+        certificate_template, expositor_name, title, authors, text_color,
+        regular_font_path, bold_font_path, italic_font_path,
+        expositor_size, title_size, authors_size, width=width,
+    )
+    pdf_bytes = render_to_bytes(
+        output or RasterPdfOutput(), certificate_template, runs
+    )
+    return filename or certificate_filename(expositor_name), pdf_bytes
+
+
+def congress_settings(folder_path="congreso_neurociencias"):
+    """
+    Template, fuentes, colores y tamaños de los certificados de expositores
+    del congreso, como argumentos para create_exposition_certificate.
+    """
+    certificate_template = os.path.join(folder_path, "certificate_poster.png")
+    font_dir = os.path.join(folder_path, "nunito-sans")
+    width, _ = template_size(certificate_template)
+    return {
+        'certificate_template': certificate_template,
+        'text_color': "#000000",
+        'regular_font_path': os.path.join(font_dir, "NunitoSans-Regular.ttf"),
+        'bold_font_path': os.path.join(font_dir, "NunitoSans-Bold.ttf"),
+        'italic_font_path': os.path.join(font_dir, "NunitoSans-Italic.ttf"),
+        # Tamaños máximos de partida
+        'expositor_size': 50,
+        'title_size': 40,
+        'authors_size': 33,
+        'width': width,
+    }
+
+
 # === MAIN SCRIPT ===
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Crea los certificados de los expositores del congreso."
+    )
+    add_output_arguments(parser)
+    parser.add_argument(
+        "--force", action="store_true",
+        help="crea todos los certificados, aunque no hayan cambiado",
+    )
+    args = parser.parse_args()
+
     folder_path = "congreso_neurociencias"
     csv_path = os.path.join(folder_path, "Presentadores Congreso.csv")
-    certificate_template = os.path.join(folder_path, "certificate_poster.png")
-
-    font_dir = os.path.join(folder_path, "nunito-sans")
-    regular_font = os.path.join(font_dir, "NunitoSans-Regular.ttf")
-    bold_font = os.path.join(font_dir, "NunitoSans-Bold.ttf")
-    italic_font = os.path.join(font_dir, "NunitoSans-Italic.ttf")
 
     certificate_folder = os.path.join(folder_path, "certificados_expositores")
     os.makedirs(certificate_folder, exist_ok=True)
 
-    text_color = "#000000"
+    # Template, fuentes, color y tamaños
+    settings = congress_settings(folder_path)
 
-    with Image.open(certificate_template) as img:
-        width, _ = img.size
+    output = make_output(
+        args.output,
+        os.path.join(certificate_folder, "certificados_expositores.pdf"),
+        **output_options(args),
+    )
+    stats = OutputStats()
 
-    # Tamaños máximos de partida
-    expositor_size = 50
-    title_size = 40
-    authors_size = 33
+    # Sólo se crean los certificados nuevos o que cambiaron (el PDF
+    # combinado se rehace entero)
+    incremental = args.output != "combined"
+    manifest = RenderManifest(certificate_folder)
+    fingerprint_files = [
+        settings['certificate_template'],
+        settings['regular_font_path'],
+        settings['bold_font_path'],
+        settings['italic_font_path'],
+    ]
+    fingerprint_params = {
+        'text_color': settings['text_color'],
+        'expositor_size': settings['expositor_size'],
+        'title_size': settings['title_size'],
+        'authors_size': settings['authors_size'],
+        'width': settings['width'],
+        'output': [args.output, output_options(args)],
+    }
+    skipped_count = 0
+
+    # El título es la primera columna del CSV y el email la cuarta
+    columns = {
+        'title': 0, 'expositor': 'PRESENTADOR/A', 'authors': 'AUTORES',
+        'email': 3,
+    }
 
     try:
-        df = pd.read_csv(csv_path)
+        # Filas repetidas (mismo expositor, email y título) se crean una
+        # sola vez; un expositor con dos pósters, o dos personas con el
+        # mismo nombre de archivo, tienen un archivo cada uno
+        check = RosterCheck(
+            load_roster(csv_path, columns),
+            name='expositor', email='email', fields=('title',),
+        )
+        check.report()
+        for row, filename in check.certificates():
+            title = row.title
+            expositor = row.expositor
+            authors = row.authors
 
-        for _, row in df.iterrows():
-            title = row.iloc[0]
-            expositor = row['PRESENTADOR/A']
-            authors = row['AUTORES']
+            if not title.strip() or not expositor.strip():
+                continue
 
-            if pd.isna(title) or pd.isna(expositor):
+            fingerprint = certificate_fingerprint(
+                {'title': title, 'expositor': expositor, 'authors': authors},
+                fingerprint_files,
+                fingerprint_params,
+            )
+            if incremental and not args.force and manifest.is_current(filename, fingerprint):
+                skipped_count += 1
                 continue
 
             try:
                 filename = create_exposition_certificate(
-                    certificate_template=certificate_template,
                     expositor_name=expositor,
                     title=title,
                     authors=authors,
-                    text_color=text_color,
-                    regular_font_path=regular_font,
-                    bold_font_path=bold_font,
-                    italic_font_path=italic_font,
-                    expositor_size=expositor_size,
-                    title_size=title_size,
-                    authors_size=authors_size,
                     save_path=certificate_folder,
-                    width=width
+                    output=output,
+                    filename=filename,
+                    **settings,
                 )
                 print(f"✅ Certificado creado: {filename}")
+                if args.output == "combined":
+                    # Sólo una página del PDF combinado, que se cuenta una
+                    # vez al final; un archivo con este nombre es de otra corrida
+                    stats.add()
+                else:
+                    stats.add(os.path.join(certificate_folder, filename))
+                manifest.record(filename, fingerprint)
             except Exception as e:
                 print(f"❌ Error creando certificado para {expositor}: {str(e)}")
 
+        output.close()
+        if args.output == "combined":
+            stats.add_file(output.path)
+        stale = []
+        if incremental:
+            stale = manifest.stale()
+            manifest.save()
+
+        print(f"\nSin cambios (no se volvieron a crear): {skipped_count}")
+        stats.report()
+        if stale:
+            print("Certificados que ya no están en el CSV (no se borraron):")
+            for filename in stale:
+                print(f"- {filename}")
+
     except Exception as e:
         print(f"❌ Error leyendo el CSV: {str(e)}")
@@ -0,0 +1,103 @@
+"""
+Name normalization shared by the creation scripts, the certificate lookup and
+the send ledger.
+
+Every roster name needs three forms:
+
+- display: words capitalized, as printed on the certificate
+- filename: lowercase, without accents, as in certificado_<filename>.pdf
+- match: the filename form used to compare roster names, certificate files
+  and ledger keys
+
+Accents are removed with the Unicode decomposition (NFKD) of the text, so
+any accented Latin letter is covered (á, Ç, ã, ö, ...), plus a few letters
+that do not decompose (ß, ø, ł, ...). normalize_names() lowercases and folds
+a whole column of names at once, in a few C-level passes over one string.
+The keys of every name seen are memoized, so normalization never runs twice
+for the same string.
+"""
+import re
+import unicodedata
+from collections import namedtuple
+
+# The three forms of a name
+NameKeys = namedtuple('NameKeys', ['display', 'filename', 'match'])
+
+# Letters without a decomposition into base letter + accent
+_SPECIAL_LETTERS = {
+    'ß': 'ss', 'æ': 'ae', 'Æ': 'AE', 'œ': 'oe', 'Œ': 'OE', 'ø': 'o', 'Ø': 'O',
+    'ł': 'l', 'Ł': 'L', 'đ': 'd', 'Đ': 'D', 'ð': 'd', 'Ð': 'D', 'þ': 'th',
+    'Þ': 'TH', 'ı': 'i',
+}
+
+# Anything left after the decomposition that is neither ASCII nor an accent
+_NOT_LATIN = re.compile('[^\x00-\x7f\u0300-\u036f]')
+
+# Characters that cannot appear in a filename
+_FILENAME_UNSAFE = '/\\'
+
+_cache = {}
+
+
+def strip_accents(text):
+    """text without accents (á -> a, Ç -> C, ã -> a, ö -> o, ß -> ss, ...)."""
+    if text.isascii():
+        return text
+    for char, base in _SPECIAL_LETTERS.items():
+        if char in text:
+            text = text.replace(char, base)
+    decomposed = unicodedata.normalize('NFKD', text)
+    if not _NOT_LATIN.search(decomposed):
+        # Only ASCII letters and their accents left: drop the accents
+        return decomposed.encode('ascii', 'ignore').decode('ascii')
+    # Other scripts: keep their letters, drop only the marks
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def display_name(name):
+    """Capitalize the first letter of each word, keeping the rest as is."""
+    return ' '.join(
+        word[0].upper() + word[1:] if word[0].isalpha() else word
+        for word in name.split()
+    )
+
+
+def normalize_names(names):
+    """
+    NameKeys for a column of names, computed in one batched pass.
+
+    Args:
+        names: Iterable of names (e.g. a roster column)
+
+    Returns:
+        List of NameKeys, in the order of names
+    """
+    names = list(names)
+    missing = list(dict.fromkeys(n for n in names if n not in _cache))
+    if missing:
+        # Lowercase and fold the whole column at once; names never hold
+        # a newline once split into words
+        joined = '\n'.join(' '.join(name.split()) for name in missing)
+        folded = strip_accents(joined.lower())
+        for char in _FILENAME_UNSAFE:
+            folded = folded.replace(char, '-')
+        folded = folded.split('\n')
+        for name, key in zip(missing, folded):
+            keys = NameKeys(display_name(name), key, key)
+            _cache[name] = keys
+            # The display name (what the creators pass on) has the same keys
+            _cache.setdefault(keys.display, keys)
+    return [_cache[name] for name in names]
+
+
+def name_keys(name):
+    """NameKeys of one name (memoized, see normalize_names)."""
+    keys = _cache.get(name)
+    if keys is None:
+        keys = normalize_names([name])[0]
+    return keys
+
+
+def match_key(name):
+    """Lowercase name without accents and with single spaces."""
+    return name_keys(name).match
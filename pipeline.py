@@ -0,0 +1,66 @@
+"""
+Overlapped rendering and sending.
+
+Instead of rendering the whole batch with the create_* scripts and only then
+starting a send_* script, the sending scripts can render in a pool of
+processes while they send. A RenderPool renders certificates ahead of the
+SMTP workers: each roster row submits its certificate to the pool and
+becomes a send job that waits for the rendered PDF, and read_ahead keeps a
+fixed number of those jobs (and so of renders) in flight.
+
+The first emails go out as soon as the first certificates are rendered,
+memory is bounded by the read-ahead window, and the run takes about as long
+as the slower of the two stages.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+class RenderPool:
+    """
+    Processes rendering certificates for the send jobs.
+
+    Args:
+        workers: Number of rendering processes
+        window: Renders kept in flight ahead of the senders (default: four
+            per process); see read_ahead
+    """
+
+    def __init__(self, workers=1, window=None):
+        self.workers = workers
+        self.window = window or 4 * workers
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+
+    def submit(self, render, *args):
+        """
+        Start rendering in the pool.
+
+        Returns:
+            Future with the result of render(*args), e.g. (path, pdf_bytes)
+        """
+        return self.executor.submit(render, *args)
+
+    def close(self):
+        """Stop the processes, dropping renders nobody will send."""
+        self.executor.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_ahead(iterable, window):
+    """
+    Yield the items of iterable while keeping `window` more already pulled
+    from it, so the work each item starts when it is created (such as a
+    render submitted to a RenderPool) runs ahead of its consumer.
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(item)
+        if len(pending) > window:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
@@ -0,0 +1,307 @@
+"""
+Sending rate limits for the certificate emails.
+
+A RateLimiter paces the messages of an account with a token bucket for the
+per-minute budget, so bursts go out at full speed while the rate never
+exceeds the provider's limit. The hourly and daily budgets are hard limits:
+a SendWindow remembers when each message of the last hour (or day) was sent
+and allows no more than the budget in any such window, however long the
+script has been idle.
+
+The rate adapts to the server: a temporary failure (4xx reply, e.g. 421 or
+451) halves the refill rate and pauses sending for a cooldown, and after a
+run of successful sends the rate doubles again up to the configured budget.
+
+The bucket levels and send times can be saved to a state file, so the
+budgets also hold across separate runs of the sending scripts.
+"""
+import asyncio
+import json
+import os
+import smtplib
+import threading
+import time
+from collections import deque
+
+
+# Seconds in each budget's period
+PERIODS = {'per_minute': 60, 'per_hour': 3600, 'per_day': 86400}
+
+# Budgets enforced as hard windows rather than a refilling bucket
+WINDOWS = ('per_hour', 'per_day')
+
+
+class RateLimitExhausted(Exception):
+    """The next message could only be sent after waiting longer than allowed."""
+
+    def __init__(self, wait):
+        self.wait = wait
+        super().__init__(f"next message allowed in {wait / 60:.0f} minutes")
+
+
+def reply_codes(error):
+    """SMTP reply codes carried by an smtplib exception."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return [code for code, _ in error.recipients.values()]
+    if isinstance(error, smtplib.SMTPResponseException):
+        return [error.smtp_code]
+    return []
+
+
+def is_temporary_failure(error):
+    """True for 4xx replies: the server asks us to slow down or retry later."""
+    return any(400 <= code < 500 for code in reply_codes(error))
+
+
+class TokenBucket:
+    """
+    capacity messages per period seconds, refilled continuously.
+
+    The refill rate is multiplied by factor, which the RateLimiter lowers
+    after temporary failures.
+    """
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.period = period
+        self.tokens = float(capacity)
+        self.updated = time.time()
+
+    def refill(self, now, factor=1.0):
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(
+            self.capacity, self.tokens + elapsed * self.capacity / self.period * factor
+        )
+        self.updated = now
+
+    def wait_time(self, factor=1.0):
+        """Seconds until a token is available."""
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * self.period / self.capacity / factor
+
+
+class SendWindow:
+    """
+    At most capacity messages in any period seconds.
+
+    The send times of the last period are kept, so unlike a bucket an idle
+    stretch never adds to the budget.
+    """
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.period = period
+        self.sent = deque()
+
+    def expire(self, now):
+        """Forget the messages sent before the window."""
+        while self.sent and self.sent[0] <= now - self.period:
+            self.sent.popleft()
+
+    def remaining(self, now):
+        """Messages that may still be sent in the window."""
+        self.expire(now)
+        return max(0, self.capacity - len(self.sent))
+
+    def wait_time(self, now):
+        """Seconds until a message may be sent."""
+        if self.remaining(now):
+            return 0.0
+        # The message whose expiry leaves room for one more
+        return self.sent[len(self.sent) - self.capacity] + self.period - now
+
+    def take(self, now):
+        self.sent.append(now)
+
+
+class RateLimiter:
+    """
+    Per-account sending budgets shared by all the connections of a run.
+
+    Args:
+        per_minute: Messages per minute, paced by a token bucket (None for
+            no limit)
+        per_hour, per_day: Maximum messages in any hour or day (None for no
+            limit)
+        state_path: JSON file where the bucket levels are kept between runs
+        account: Key of this account in the state file
+        max_wait: Longest wait (seconds) before giving up with
+            RateLimitExhausted, e.g. when the daily budget is used up
+        cooldown: Pause (seconds) after a temporary failure
+        recover_after: Successful sends before the rate is raised again
+        min_factor: Lowest fraction of the configured rate
+    """
+
+    def __init__(self, per_minute=None, per_hour=None, per_day=None,
+                 state_path=None, account='default', max_wait=900,
+                 cooldown=60, recover_after=20, min_factor=1 / 16):
+        budgets = {'per_minute': per_minute, 'per_hour': per_hour, 'per_day': per_day}
+        self.buckets = {
+            name: TokenBucket(capacity, PERIODS[name])
+            for name, capacity in budgets.items()
+            if capacity and name not in WINDOWS
+        }
+        self.windows = {
+            name: SendWindow(capacity, PERIODS[name])
+            for name, capacity in budgets.items()
+            if capacity and name in WINDOWS
+        }
+        self.state_path = state_path
+        self.account = account
+        self.max_wait = max_wait
+        self.cooldown = cooldown
+        self.recover_after = recover_after
+        self.min_factor = min_factor
+        self.factor = 1.0
+        self.successes = 0
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+        if state_path:
+            self._load()
+
+    def reserve(self):
+        """
+        Take a token from every bucket and a place in every window if all
+        have one.
+
+        Returns:
+            0 if the message can be sent now, otherwise the seconds to wait
+            before trying again (nothing is taken then)
+        """
+        with self.lock:
+            now = time.time()
+            for bucket in self.buckets.values():
+                bucket.refill(now, self.factor)
+            wait = max(
+                [self.paused_until - now]
+                + [b.wait_time(self.factor) for b in self.buckets.values()]
+                + [w.wait_time(now) for w in self.windows.values()]
+            )
+            if wait > 0:
+                return wait
+            for bucket in self.buckets.values():
+                bucket.tokens -= 1
+            for window in self.windows.values():
+                window.take(now)
+            return 0.0
+
+    def remaining(self):
+        """Messages the tightest budget allows right now (None if unlimited)."""
+        if not self.buckets and not self.windows:
+            return None
+        with self.lock:
+            now = time.time()
+            for bucket in self.buckets.values():
+                bucket.refill(now, self.factor)
+            return int(min(
+                [bucket.tokens for bucket in self.buckets.values()]
+                + [window.remaining(now) for window in self.windows.values()]
+            ))
+
+    async def acquire(self):
+        """Wait until a message may be sent (raises RateLimitExhausted)."""
+        while True:
+            wait = self.reserve()
+            if not wait:
+                return
+            if wait > self.max_wait:
+                raise RateLimitExhausted(wait)
+            await asyncio.sleep(wait)
+
+    def throttle(self, error=None):
+        """Slow down after a temporary failure."""
+        with self.lock:
+            self.factor = max(self.min_factor, self.factor / 2)
+            self.successes = 0
+            self.paused_until = time.time() + self.cooldown
+        print(f"⚠️ Server asked to slow down ({str(error)}). "
+              f"Pausing {self.cooldown} s, rate now {self.factor:.0%} of the budget")
+
+    def success(self):
+        """Record a sent message; raise the rate again after a good run."""
+        with self.lock:
+            if self.factor >= 1:
+                return
+            self.successes += 1
+            if self.successes >= self.recover_after:
+                self.factor = min(1.0, self.factor * 2)
+                self.successes = 0
+
+    def observe(self, error=None):
+        """Feed the outcome of one SMTP transaction (error is None if sent)."""
+        if error is None:
+            self.success()
+        elif is_temporary_failure(error):
+            self.throttle(error)
+
+    def _load(self):
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f).get(self.account, {})
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable rate limit state: {str(e)}")
+            return
+        for name, bucket in self.buckets.items():
+            if 'tokens' in state.get(name, {}):
+                bucket.tokens = min(bucket.capacity, state[name]['tokens'])
+                bucket.updated = state[name]['updated']
+        for name, window in self.windows.items():
+            saved = state.get(name, {})
+            if 'sent' in saved:
+                window.sent.extend(sorted(saved['sent']))
+            elif 'tokens' in saved:
+                # Bucket level saved by an older version: count the
+                # messages it was missing as sent when it was saved
+                used = round(window.capacity - saved['tokens'])
+                window.sent.extend([saved['updated']] * max(0, used))
+            window.expire(time.time())
+
+    def save(self):
+        """Write the bucket levels and send times of this account to the state file."""
+        if not self.state_path:
+            return
+        state = {}
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            except Exception:
+                state = {}
+        with self.lock:
+            now = time.time()
+            state[self.account] = {
+                name: {'tokens': bucket.tokens, 'updated': bucket.updated}
+                for name, bucket in self.buckets.items()
+            }
+            for name, window in self.windows.items():
+                window.expire(now)
+                state[self.account][name] = {'sent': list(window.sent)}
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+
+def rate_limiter_from_config(config, state_path=None, **defaults):
+    """
+    Create a RateLimiter from a config module (config_gmail or
+    config_hostinger).
+
+    SEND_LIMIT_PER_MINUTE, SEND_LIMIT_PER_HOUR and SEND_LIMIT_PER_DAY in the
+    config override the per_minute, per_hour and per_day defaults given by
+    the script; set one to None to disable it. SEND_THROTTLE_COOLDOWN sets
+    the pause after a temporary failure (60 s by default).
+    """
+    budgets = {
+        name: getattr(config, f"SEND_LIMIT_{name.upper()}", defaults.get(name))
+        for name in PERIODS
+    }
+    return RateLimiter(
+        **budgets,
+        state_path=state_path,
+        account=config.EMAIL_USER,
+        cooldown=getattr(config, 'SEND_THROTTLE_COOLDOWN', 60),
+    )
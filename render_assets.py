@@ -0,0 +1,125 @@
+"""
+Shared assets for the certificate renderers.
+
+Templates are decoded once per process and every render receives its own
+cheap in-memory copy instead of re-reading the PNG/JPG from disk. Fonts are
+kept in a bounded LRU registry keyed by (font path, size) and text widths are
+memoized per (font, string).
+"""
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Maximum number of (font path, size) pairs kept parsed in memory
+FONT_CACHE_SIZE = 128
+
+# Maximum number of memoized (font, mode, text) width measurements
+TEXT_LENGTH_CACHE_SIZE = 65536
+
+
+@lru_cache(maxsize=None)
+def _decoded_template(certificate_template, mode=None, scale=1.0):
+    """Open and fully decode a template image (cached per path, mode and scale)."""
+    if scale != 1:
+        im = _decoded_template(certificate_template, mode)
+        width, height = im.size
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return im.resize(size, Image.LANCZOS)
+    with Image.open(certificate_template) as im:
+        if mode and im.mode != mode:
+            return im.convert(mode)
+        im.load()
+        return im.copy()
+
+
+def load_template(certificate_template, mode=None, scale=1.0):
+    """
+    Return a fresh copy of a certificate template ready to be drawn on.
+
+    Args:
+        certificate_template: Path to the certificate template image
+        mode: Optional PIL mode (e.g. 'RGB') to convert the template to once,
+            up front, instead of on every save
+        scale: Optional resize factor, also applied once up front
+
+    Returns:
+        A PIL image that can be modified freely by the caller
+    """
+    return _decoded_template(certificate_template, mode, scale).copy()
+
+
+@lru_cache(maxsize=None)
+def _template_header(certificate_template):
+    """Read (size, mode) of a template without decoding its pixels."""
+    with Image.open(certificate_template) as im:
+        return im.size, im.mode
+
+
+def template_size(certificate_template):
+    """Return (width, height) of a template, reading only its header."""
+    return _template_header(certificate_template)[0]
+
+
+@lru_cache(maxsize=None)
+def _measuring_draw(mode):
+    return ImageDraw.Draw(Image.new(mode, (1, 1)))
+
+
+def measuring_draw(certificate_template):
+    """
+    Return an ImageDraw that measures text exactly like a draw on the
+    template would, without copying the template's pixels.
+    """
+    return _measuring_draw(_template_header(certificate_template)[1])
+
+
+def clear_template_cache():
+    """Drop every decoded template (e.g. after editing the template file)."""
+    _decoded_template.cache_clear()
+    _template_header.cache_clear()
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def get_font(font_path, size):
+    """
+    Return a TrueType font from the process-wide registry.
+
+    Args:
+        font_path: Path to the .ttf file
+        size: Font size in points
+
+    Returns:
+        The shared ImageFont.FreeTypeFont for (font_path, size)
+    """
+    return ImageFont.truetype(font_path, size)
+
+
+def font_cache_info():
+    """Return hits, misses, maxsize and currsize of the font registry."""
+    return get_font.cache_info()
+
+
+def clear_font_cache():
+    """Drop every parsed font from the registry."""
+    get_font.cache_clear()
+    _text_length.cache_clear()
+
+
+@lru_cache(maxsize=TEXT_LENGTH_CACHE_SIZE)
+def _text_length(font, fontmode, text):
+    return font.getlength(text, fontmode)
+
+
+def text_length(draw, text, font):
+    """
+    Memoized equivalent of draw.textlength(text, font=font).
+
+    Args:
+        draw: ImageDraw used for rendering (only its font mode matters)
+        text: String to measure
+        font: Font from get_font()
+
+    Returns:
+        Advance width of the text in pixels
+    """
+    return _text_length(font, draw.fontmode, text)
@@ -0,0 +1,99 @@
+"""
+Render manifest for incremental certificate generation.
+
+Each rendered certificate is recorded in a JSON manifest next to the PDFs
+together with a fingerprint of everything that affects its content: the
+roster fields, the template and font files and the layout parameters. On
+the next run only certificates whose fingerprint changed (or whose PDF is
+missing) are rendered again.
+"""
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+MANIFEST_FILENAME = ".render_manifest.json"
+
+
+@lru_cache(maxsize=None)
+def file_digest(path):
+    """SHA-256 of a file's contents (computed once per run)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def certificate_fingerprint(fields, files, params):
+    """
+    Fingerprint of a single certificate.
+
+    Args:
+        fields: Roster values printed on the certificate (dict)
+        files: Paths of the template and font files used
+        params: Layout parameters (sizes, colors, output kind, ...)
+
+    Returns:
+        Hex digest identifying the certificate's content
+    """
+    payload = json.dumps(
+        {
+            'fields': fields,
+            'files': [file_digest(path) for path in files],
+            'params': params,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class RenderManifest:
+    """Filename -> fingerprint record of the certificates in a folder."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, MANIFEST_FILENAME)
+        self.entries = {}
+        self.seen = set()
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable render manifest: {str(e)}")
+
+    def is_current(self, filename, fingerprint):
+        """True if the PDF exists and was rendered from the same inputs."""
+        self.seen.add(filename)
+        return (
+            self.entries.get(filename) == fingerprint
+            and os.path.exists(os.path.join(self.folder, filename))
+        )
+
+    def record(self, filename, fingerprint):
+        """Remember that filename was rendered from fingerprint."""
+        self.seen.add(filename)
+        self.entries[filename] = fingerprint
+
+    def stale(self):
+        """
+        PDFs in the manifest that no roster row produced this run. Entries
+        whose PDF was already deleted are dropped from the manifest.
+        """
+        stale = []
+        for filename in sorted(set(self.entries) - self.seen):
+            if os.path.exists(os.path.join(self.folder, filename)):
+                stale.append(filename)
+            else:
+                del self.entries[filename]
+        return stale
+
+    def save(self):
+        """Write the manifest atomically."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
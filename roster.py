@@ -0,0 +1,242 @@
+"""
+Access to the registration rosters (Google Forms CSV exports and Excel
+sheets such as lista_alumnos.xlsx).
+
+Rows are read lazily and projected onto only the columns a script needs.
+The delimiter, quoting and encoding of a CSV are detected from the first
+block of the file instead of being fixed per script, and .xlsx files are
+streamed with openpyxl in read-only mode.
+
+The scripts load the whole projected roster with load_roster(): the
+duplicate and filename collision check (roster_check.py) needs every row
+before the first certificate is created or sent. Memory then grows with the
+number of rows, but only by the few columns each script reads, never by the
+whole form export.
+
+load_roster() also keeps the projected roster in a JSON cache next to the
+file, keyed by the file's modification time and content hash, so repeated
+runs (and test sends) skip parsing altogether.
+"""
+import codecs
+import csv
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+try:
+    from openpyxl import load_workbook
+except ImportError:  # only needed for .xlsx rosters
+    load_workbook = None
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+
+# Bytes read to detect the encoding and dialect of a CSV
+SNIFF_BYTES = 64 * 1024
+
+CACHE_DIR = '.roster_cache'
+CACHE_VERSION = 2
+
+
+def _column_position(column, header):
+    """Resolve a column given by name or by position to its index."""
+    if isinstance(column, int):
+        return column
+    try:
+        return header.index(column)
+    except ValueError:
+        raise KeyError(f"Column '{column}' not found in header: {header}")
+
+
+def sniff_csv(csv_path, delimiters=',;\t|'):
+    """
+    Detect the encoding and dialect of a CSV from its first block.
+
+    Returns:
+        (encoding, dialect): 'utf-8-sig' (with or without BOM) or 'cp1252'
+        when the block is not valid UTF-8, and a csv dialect (comma
+        separated if it cannot be detected)
+    """
+    with open(csv_path, 'rb') as f:
+        sample = f.read(SNIFF_BYTES)
+    try:
+        # A multi-byte character may be cut at the end of the block
+        text = codecs.getincrementaldecoder('utf-8-sig')().decode(sample)
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError:
+        text = sample.decode('cp1252', errors='replace')
+        encoding = 'cp1252'
+
+    # Sniff whole lines only
+    if len(sample) == SNIFF_BYTES and '\n' in text:
+        text = text[:text.rindex('\n')]
+    try:
+        dialect = csv.Sniffer().sniff(text, delimiters=delimiters)
+    except csv.Error:
+        dialect = csv.excel
+    return encoding, dialect
+
+
+def _iter_csv_rows(csv_path, delimiter=None, encoding=None):
+    sniffed_encoding, dialect = sniff_csv(csv_path)
+    encoding = encoding or sniffed_encoding
+    # A few bytes are undefined in cp1252; replaced, as in sniff_csv
+    errors = 'replace' if encoding == 'cp1252' else 'strict'
+    with open(csv_path, 'r', encoding=encoding, errors=errors,
+              newline='') as csvfile:
+        if delimiter:
+            reader = csv.reader(csvfile, delimiter=delimiter)
+        else:
+            reader = csv.reader(csvfile, dialect)
+        try:
+            yield from reader
+        except UnicodeDecodeError as e:
+            raise ValueError(
+                f"{csv_path} is not valid {encoding} past its first "
+                f"{SNIFF_BYTES // 1024} KB ({e.reason}); pass the file's "
+                f"encoding explicitly, e.g. encoding='cp1252'"
+            ) from e
+
+
+def _iter_excel_rows(xlsx_path, sheet=None):
+    if load_workbook is None:
+        raise ImportError(
+            "openpyxl is required for .xlsx rosters: pip install openpyxl"
+        )
+    workbook = load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        for row in worksheet.iter_rows(values_only=True):
+            yield ['' if value is None else str(value) for value in row]
+    finally:
+        workbook.close()
+
+
+def iter_rows(path, delimiter=None, encoding=None, sheet=None):
+    """
+    Raw rows (lists of strings, header first) of a CSV or Excel roster.
+
+    Args:
+        path: .csv or .xlsx file
+        delimiter: CSV delimiter (detected if None)
+        encoding: CSV encoding (detected if None)
+        sheet: Excel sheet name (the active one if None)
+    """
+    if path.lower().endswith(EXCEL_EXTENSIONS):
+        return _iter_excel_rows(path, sheet)
+    return _iter_csv_rows(path, delimiter, encoding)
+
+
+def iter_roster_chunks(csv_path, columns, chunk_size=500, delimiter=None,
+                       encoding=None, sheet=None):
+    """
+    Read a roster in chunks of lightweight records.
+
+    Args:
+        csv_path: Path to the CSV (or .xlsx) file
+        columns: Mapping of record field -> column name or position,
+            e.g. {'name': 'Nombre y Apellido', 'title': 0}
+        chunk_size: Number of records per chunk
+        delimiter: CSV delimiter (detected if None)
+        encoding: File encoding (detected if None)
+        sheet: Excel sheet name (the active one if None)
+
+    Yields:
+        Lists of RosterRow namedtuples with a row_number field (1 for the
+        first data row) followed by the requested fields. Missing cells are
+        returned as empty strings.
+    """
+    RosterRow = namedtuple('RosterRow', ['row_number', *columns])
+
+    rows = iter_rows(csv_path, delimiter, encoding, sheet)
+    header = next(rows, [])
+    positions = [_column_position(c, header) for c in columns.values()]
+
+    chunk = []
+    for row_number, row in enumerate(rows, start=1):
+        values = [row[i] if i < len(row) else '' for i in positions]
+        chunk.append(RosterRow(row_number, *values))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def file_hash(path):
+    """sha256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_path(path, columns, options):
+    key = repr((os.path.abspath(path), sorted(columns.items(), key=str), options))
+    name = hashlib.sha256(key.encode('utf-8')).hexdigest()[:20]
+    return os.path.join(os.path.dirname(path), CACHE_DIR, f"{name}.json")
+
+
+def load_roster(path, columns, cache=True, **kwargs):
+    """
+    All the records of a roster (see iter_roster_chunks), from the JSON
+    cache when the file has not changed.
+
+    The cache is reused when the file's modification time and size are the
+    ones it was built from; if only the modification time changed (the file
+    was copied or touched) the content hash decides. A cache that cannot be
+    read or written (e.g. a read-only data folder) is ignored.
+
+    Args:
+        path: .csv or .xlsx roster
+        columns: Mapping of record field -> column name or position
+        cache: Read and write the cache (in .roster_cache next to path)
+        **kwargs: delimiter, encoding or sheet for iter_roster_chunks
+
+    Returns:
+        List of RosterRow namedtuples
+    """
+    RosterRow = namedtuple('RosterRow', ['row_number', *columns])
+    cache_path = _cache_path(path, columns, sorted(kwargs.items()))
+    stat = os.stat(path)
+    digest = None
+
+    records = None
+    if cache and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached['version'] == CACHE_VERSION:
+                if (cached['mtime'], cached['size']) == (stat.st_mtime_ns, stat.st_size):
+                    return [RosterRow._make(values) for values in cached['rows']]
+                if cached['size'] == stat.st_size:
+                    digest = file_hash(path)
+                    if digest == cached['hash']:
+                        # Same contents, new modification time: just
+                        # update the cache below
+                        records = [RosterRow._make(values) for values in cached['rows']]
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable roster cache: {str(e)}")
+
+    if records is None:
+        records = [
+            record for chunk in iter_roster_chunks(path, columns, **kwargs)
+            for record in chunk
+        ]
+    if cache:
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = cache_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'version': CACHE_VERSION,
+                    'mtime': stat.st_mtime_ns,
+                    'size': stat.st_size,
+                    'hash': digest or file_hash(path),
+                    'rows': [list(record) for record in records],
+                }, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"⚠️ Could not write the roster cache: {str(e)}")
+    return records
@@ -0,0 +1,147 @@
+"""
+Pre-pass over a roster before anything is rendered or sent.
+
+Google Forms exports often hold the same registration twice, and two
+different people can end up with the same certificate filename ("José
+Pérez" and "Jose Perez" are both certificado_jose perez.pdf), so one PDF
+silently overwrites the other and may be mailed to the wrong person.
+A RosterCheck goes over the roster once, hashing every row:
+
+- duplicates: rows with the same normalized name and email (and the same
+  certificate fields, e.g. the poster title) are collapsed into the first
+- collisions: different certificates that would be saved under the same
+  filename; each of them gets a disambiguated filename instead, made of
+  the usual one plus a short hash of the certificate's content
+
+The filenames only depend on the row's own content, so the creation and
+the sending scripts agree on them without sharing any state.
+"""
+import hashlib
+from collections import defaultdict
+
+from certificate_index import PREFIX
+from names import name_keys, normalize_names
+
+
+def _clean(value):
+    """A roster value with single spaces."""
+    return ' '.join(value.split())
+
+
+def disambiguated_filename(name, *fields):
+    """
+    Filename of a certificate whose usual filename is shared with other
+    certificates, e.g. certificado_jose perez 3f2a1c.pdf
+
+    Args:
+        name: Participant name as written in the roster
+        *fields: Other values printed on the certificate (e.g. the title)
+    """
+    keys = name_keys(name)
+    content = '\x1f'.join([keys.display, *map(_clean, fields)])
+    digest = hashlib.sha1(content.encode('utf-8')).hexdigest()[:6]
+    return f"{PREFIX}{keys.filename} {digest}.pdf"
+
+
+class RosterCheck:
+    """
+    Duplicate rows and filename collisions of a roster.
+
+    Args:
+        records: RosterRow records (see roster.py), in roster order
+        name: Field holding the participant's name
+        email: Field holding the email, if the roster has one
+        fields: Other fields printed on the certificate (e.g. ('title',))
+
+    Attributes:
+        rows: Records left after removing the duplicates, in roster order
+        duplicates: (record, first record with the same person) pairs
+        collisions: Filename key -> records of the different certificates
+            that share it
+    """
+
+    def __init__(self, records, name='name', email=None, fields=()):
+        self.name = name
+        self.fields = tuple(fields)
+        self.rows = []
+        self.duplicates = []
+        self.collisions = {}
+        self._filenames = {}
+
+        records = list(records)
+        normalize_names(getattr(record, name) for record in records)
+
+        first_rows = {}
+        # filename key -> certificate content -> records
+        certificates = defaultdict(lambda: defaultdict(list))
+        for record in records:
+            person = getattr(record, name)
+            if not person.strip():
+                # Reported and skipped by the scripts themselves
+                self.rows.append(record)
+                continue
+            keys = name_keys(person)
+            values = [_clean(getattr(record, field)) for field in self.fields]
+            address = getattr(record, email).strip().lower() if email else ''
+
+            key = (keys.match, address, *(value.lower() for value in values))
+            first = first_rows.setdefault(key, record)
+            if first is not record:
+                self.duplicates.append((record, first))
+                continue
+            self.rows.append(record)
+            certificates[keys.filename][(keys.display, *values)].append(record)
+
+        for key, contents in certificates.items():
+            if len(contents) < 2:
+                continue
+            self.collisions[key] = [r for members in contents.values() for r in members]
+            for (display, *values), members in contents.items():
+                filename = disambiguated_filename(display, *values)
+                for record in members:
+                    self._filenames[record.row_number] = filename
+
+    def collides(self, record):
+        """True if the record's usual filename is shared with other certificates."""
+        return record.row_number in self._filenames
+
+    def filename(self, record):
+        """Filename the record's certificate is saved with."""
+        filename = self._filenames.get(record.row_number)
+        if filename is None:
+            filename = f"{PREFIX}{name_keys(getattr(record, self.name)).filename}.pdf"
+        return filename
+
+    def certificates(self):
+        """
+        (record, filename) of the rows left, once per certificate file: rows
+        of different people with the same certificate (same name, another
+        email) only render it once.
+        """
+        seen = set()
+        for record in self.rows:
+            if not getattr(record, self.name).strip():
+                yield record, None
+                continue
+            filename = self.filename(record)
+            if filename not in seen:
+                seen.add(filename)
+                yield record, filename
+
+    def report(self):
+        """Print the duplicates and collisions found."""
+        if self.duplicates:
+            print(f"ℹ️ {len(self.duplicates)} duplicate rows skipped:")
+            for record, first in self.duplicates:
+                person = _clean(getattr(record, self.name))
+                print(f"   - row {record.row_number} ({person}): "
+                      f"same as row {first.row_number}")
+        if self.collisions:
+            print(f"⚠️ {len(self.collisions)} certificate filenames are shared "
+                  "by different certificates, each one is saved as:")
+            for key, records in self.collisions.items():
+                print(f"   {PREFIX}{key}.pdf")
+                for record in records:
+                    person = _clean(getattr(record, self.name))
+                    print(f"   - row {record.row_number} ({person}): "
+                          f"{self.filename(record)}")
@@ -1,34 +1,98 @@
-import csv
+import importlib
 import os
 import smtplib
 import sys
 import time
 import traceback
+from functools import lru_cache
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from email.mime.application import MIMEApplication
 
 import config_gmail as config
 import email_template_asistentes as email_template
+from accounts import account_pool_from_configs
+from address_check import AddressCheck, load_suppression_list
+from async_sender import AsyncSender, SendJob
+from certificate_index import CertificateIndex
+from cli import choice_option, int_option, option_value
+from message_factory import MessageFactory
+from names import match_key
+from pipeline import RenderPool, read_ahead
+from rate_limiter import rate_limiter_from_config
+from roster import load_roster
+from roster_check import RosterCheck
+from send_ledger import SendLedger
+from send_retry import retry_policy_from_config
+from smtp_transport import transport_from_config
+from spool import FORMATS as SPOOL_FORMATS, Spool
+
+# Roster and certificates of the congress
+CERTIFICATES_DIR = "congreso_neurociencias/certificados_asistentes"
+CSV_PATH = ("congreso_neurociencias/Inscripción al Primer Congreso "
+            "Latinoamericano de Neurociencias Cognitivas  (respuestas) - "
+            "Respuestas de formulario 1.csv")
+
+# Roster columns by position: timestamp, email, country, name_and_surname
+ROSTER_COLUMNS = {'email': 1, 'name': 3}
+
+# Bucket levels of the sending budgets, kept between runs
+RATE_STATE_FILE = "congreso_neurociencias/.send_rate_state.json"
+
+# Addresses (or @domains) never to send to, one per line
+SUPPRESSION_FILE = "congreso_neurociencias/suppressed_addresses.txt"
+
+# Journal of the certificates already sent
+LEDGER_FILE = "congreso_neurociencias/sent_certificates_asistentes.jsonl"
 
 
 def normalize_name(name):
     """Normalize a name to match certificate filename format."""
-    return name.lower().strip()
+    return match_key(name)
 
 
-def find_certificate(attendee_name, certificates_dir):
-    """Find certificate PDF for an attendee."""
-    normalized_name = normalize_name(attendee_name)
+def find_certificate(attendee_name, index):
+    """
+    Find certificate PDF for an attendee in the CertificateIndex of
+    certificates_dir. Several matching certificates are reported and
+    none of them is sent.
+    """
+    match = index.lookup(attendee_name)
+    if match.kind == 'ambiguous':
+        print(f"⚠️ Several certificates match {attendee_name}:")
+        for path in match.candidates:
+            print(f"   - {os.path.basename(path)}")
+    return match.path
+
+
+def render_certificate(attendee_name, save_dir=None, filename=None):
+    """
+    Render the attendee's certificate in memory.
     
-    for filename in os.listdir(certificates_dir):
-        if filename.endswith('.pdf'):
-            # Extract name from filename (remove prefix and extension)
-            file_name = filename[len('certificado_'):-4].lower()
-            if normalized_name in file_name or file_name in normalized_name:
-                return os.path.join(certificates_dir, filename)
+    Args:
+        attendee_name: Name as written in the CSV
+        save_dir: If given, the PDF is also saved in this folder
+        filename: Filename of the certificate (see roster_check)
     
-    return None
+    Returns:
+        (certificate_path, pdf_bytes)
+    """
+    # Only needed when rendering on the fly
+    from create_assistant_certificates import (
+        capitalize_name,
+        congress_settings,
+        render_assistant_certificate,
+    )
+    
+    filename, pdf_bytes = render_assistant_certificate(
+        assistant_name=capitalize_name(attendee_name.strip()),
+        filename=filename,
+        **congress_settings(),
+    )
+    certificate_path = os.path.join(save_dir or '', filename)
+    if save_dir:
+        with open(certificate_path, 'wb') as f:
+            f.write(pdf_bytes)
+    return certificate_path, pdf_bytes
 
 
 def test_smtp_connection():
@@ -59,54 +123,63 @@ def test_smtp_connection():
         return False
 
 
-def send_certificate(attendee_name, email, certificate_path):
-    """Send certificate to attendee via email."""
+@lru_cache(maxsize=None)
+def message_factory():
+    """Headers and body template shared by every certificate email."""
+    return MessageFactory(
+        {
+            'From': config.EMAIL_FROM,
+            'Subject': email_template.SUBJECT,
+            'Reply-To': config.REPLY_TO,
+            # Additional header to reduce spam probability
+            'X-Mailer': "Python Email Sender",
+        },
+        email_template.BODY,
+        domain=config.DOMAIN,
+    )
+
+
+def send_certificate(attendee_name, email, certificate_path, certificate_data=None,
+                     transport=None):
+    """
+    Send certificate to attendee via email.
+    
+    certificate_data can hold the PDF already rendered in memory; then
+    certificate_path is only used for the attachment's filename. transport
+    is an open SmtpTransport to reuse; without it a one-off session is used.
+    Errors are printed and raised again, so the sender can classify them.
+    """
     try:
         print(f"\nPreparing email to: {email}")
         
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = config.EMAIL_FROM
-        msg['To'] = email
-        msg['Subject'] = email_template.SUBJECT
-        msg['Reply-To'] = config.REPLY_TO
-        
-        # Add additional headers to reduce spam probability
-        msg['Message-ID'] = f"<{int(time.time())}@{config.DOMAIN}>"
-        msg['X-Mailer'] = "Python Email Sender"
-        
-        # Attach message body
-        body = email_template.BODY.format(
-            attendee_name=attendee_name
-        )
-        msg.attach(MIMEText(body, 'html'))
-        
         # Attach certificate
         print(f"Attaching certificate: {os.path.basename(certificate_path)}")
         try:
-            with open(certificate_path, 'rb') as file:
-                attachment = MIMEApplication(file.read(), _subtype="pdf")
-                attachment.add_header(
-                    'Content-Disposition', 
-                    'attachment',
-                    filename=os.path.basename(certificate_path)
-                )
-                msg.attach(attachment)
-                print("✅ Certificate attached successfully")
+            if certificate_data is None:
+                with open(certificate_path, 'rb') as file:
+                    certificate_data = file.read()
         except Exception as e:
             print(f"❌ Error attaching certificate: {str(e)}")
             raise
         
-        # Connect to SMTP server and send
-        print("Connecting to SMTP server...")
-        with smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT) as server:
-            print("Starting TLS encryption...")
-            server.starttls()
-            print("Logging in...")
-            server.login(config.EMAIL_USER, config.EMAIL_PASSWORD)
-            print("Sending message...")
-            server.send_message(msg)
-            print("Message sent successfully")
+        # Create message (headers and template prepared once per run)
+        factory = message_factory()
+        message = factory.build(
+            email,
+            {'attendee_name': attendee_name},
+            certificate_data,
+            os.path.basename(certificate_path),
+        )
+        print("✅ Certificate attached successfully")
+        
+        # Send over the shared session (STARTTLS)
+        print("Sending message...")
+        if transport is None:
+            with transport_from_config(config) as one_off:
+                one_off.sendmail(factory.sender, [email.strip()], message)
+        else:
+            transport.sendmail(factory.sender, [email.strip()], message)
+        print("Message sent successfully")
             
         print(f"✅ Certificate sent to {attendee_name} ({email})")
         return True
@@ -114,18 +187,54 @@ def send_certificate(attendee_name, email, certificate_path):
     except smtplib.SMTPRecipientsRefused as e:
         print(f"❌ Recipient refused: {email}")
         print(f"SMTP Error: {str(e)}")
-        return False
+        raise
     
     except smtplib.SMTPException as e:
         print(f"❌ SMTP Error sending to {attendee_name} ({email})")
         print(f"SMTP Error: {str(e)}")
-        return False
+        raise
     
     except Exception as e:
         print(f"❌ Error sending to {attendee_name} ({email})")
         print(f"Error: {str(e)}")
         traceback.print_exc()
-        return False
+        raise
+
+
+def certificate_job(ledger_key, attendee_name, email, certificate_path=None,
+                    render=False, save_dir=None, rendered=None, filename=None):
+    """
+    Send job for one attendee (see async_sender), keyed by its ledger key.
+    
+    With render=True the certificate is rendered in memory by the worker
+    that sends it, or taken from rendered (a future of a RenderPool) when
+    given; otherwise certificate_path is attached.
+    """
+    def send(transport):
+        path, data = certificate_path, None
+        try:
+            if rendered is not None:
+                path, data = rendered.result()
+            elif render:
+                path, data = render_certificate(attendee_name, save_dir, filename)
+        except Exception as e:
+            # Kept pending in the ledger (see send_retry.classify)
+            print(f"❌ Error rendering certificate for {attendee_name}: {str(e)}")
+            raise
+        return send_certificate(attendee_name, email, path, data, transport)
+    
+    return SendJob(ledger_key, send)
+
+
+def ledger_key(attendee_name, email):
+    """Key of an attendee in the ledger of sent certificates."""
+    return f"{normalize_name(attendee_name)}:{email.strip().lower()}"
+
+
+def updated_ledger_key(key):
+    """A ledger key written with an older name normalization, updated."""
+    attendee_name, _, email = key.rpartition(':')
+    return ledger_key(attendee_name, email)
 
 
 def send_test_email(test_email):
@@ -182,68 +291,248 @@ def main():
             test_smtp_connection()
         return
     
+    # Render each certificate in memory right before sending it instead of
+    # reading it from certificates_dir (--save-pdf also keeps a copy there)
+    render = "--render" in sys.argv[1:]
+    save_pdf = "--save-pdf" in sys.argv[1:]
+    
+    # Render in N processes ahead of the senders (implies --render)
+    render_workers = int_option("--render-workers", 0)
+    render = render or render_workers > 0
+    
+    # Number of SMTP connections sending in parallel (--connections 4)
+    connections = int_option("--connections", 1, minimum=1)
+    
+    # Spread the campaign over several accounts, each with its own budgets
+    # (--accounts config_gmail,config_hostinger); `connections` per account
+    accounts = [
+        importlib.import_module(name)
+        for name in option_value("--accounts", "").split(",") if name
+    ]
+    
+    # Write the messages to a spool for a local MTA instead of sending them
+    # (--spool DIR, --spool-format maildir|mbox|eml)
+    spool_path = option_value("--spool", None)
+    spool_format = choice_option("--spool-format", "maildir", SPOOL_FORMATS)
+    
+    # Addresses never to send to (--suppress FILE)
+    suppressed = load_suppression_list(option_value("--suppress", SUPPRESSION_FILE))
+    
     # Normal operation - send certificates
-    certificates_dir = "congreso_neurociencias/certificados_asistentes"
-    csv_filename = ("Inscripción al Primer Congreso Latinoamericano de "
-                   "Neurociencias Cognitivas  (respuestas) - "
-                   "Respuestas de formulario 1.csv")
-    csv_path = f"congreso_neurociencias/{csv_filename}"
-    
-    # First test SMTP connection
-    if not test_smtp_connection():
+    certificates_dir = CERTIFICATES_DIR
+    csv_path = CSV_PATH
+    
+    # First test SMTP connection (not needed to fill a spool)
+    if not spool_path and not test_smtp_connection():
         print("❌ SMTP connection failed. Check your credentials and settings.")
         return
     
     # Track results
     success_count = 0
     error_count = 0
+    # Rows that failed while building the jobs, counted apart because the
+    # jobs are built in another thread than the one running on_result
+    row_error_count = 0
     not_found_count = 0
+    skipped_count = 0
+    dead_count = 0
+    duplicate_count = 0
+    invalid_count = 0
     not_found_attendees = []
+    dead_letters = []
     
-    # Process CSV file
-    with open(csv_path, 'r', encoding='utf-8') as csvfile:
-        reader = csv.reader(csvfile, delimiter=';')
-        next(reader)  # Skip header
-        
-        for row in reader:
-            if len(row) >= 4:  # Ensure row has enough columns
-                # Format: timestamp, email, country, name_and_surname
-                _, email, _, attendee_name = row[:4]
+    # Certificates already sent in earlier runs
+    ledger = SendLedger(LEDGER_FILE)
+    ledger.rekey(updated_ledger_key)
+    print(f"ℹ️ Found {len(ledger)} previously sent certificates")
+    
+    # Certificates folder listed once for the whole run
+    index = None if render else CertificateIndex(certificates_dir, normalize_name)
+    
+    def jobs():
+        """One send job per attendee with an email and a certificate."""
+        nonlocal not_found_count, skipped_count, dead_count, duplicate_count
+        nonlocal invalid_count, row_error_count
+        # Delimiter and encoding detected in one pass; cached between runs
+        roster = load_roster(csv_path, ROSTER_COLUMNS)
+        # Repeated registrations are sent once; names sharing a certificate
+        # filename have their own, disambiguated file. Checked on the whole
+        # roster as read, exactly as create_assistant_certificates does, so
+        # both agree on the filenames
+        check = RosterCheck(roster, email='email')
+        check.report()
+        duplicate_count = len(check.duplicates)
+        # Every address checked offline: typos fixed, malformed and
+        # suppressed ones never reach the SMTP server
+        addresses = AddressCheck(check.rows, suppressed=suppressed)
+        addresses.report()
+        invalid_count = len(addresses.rejected)
+        for row in addresses.rows:
+            try:
+                email, attendee_name = row.email, row.name
                 
-                if not email.strip():
-                    print(f"⚠️ No email found for {attendee_name}. Skipping.")
+                key = ledger_key(attendee_name, email)
+                if key in ledger:
+                    print(f"ℹ️ Already sent to {attendee_name}. Skipping.")
+                    skipped_count += 1
+                    continue
+                if ledger.status(key) == 'queued':
+                    print(f"ℹ️ Already queued for {attendee_name}. Skipping.")
+                    skipped_count += 1
+                    continue
+                if ledger.status(key) == 'dead':
+                    print(f"ℹ️ {email} refused the certificate before. Skipping.")
+                    dead_count += 1
                     continue
                 
-                # Find certificate
-                cert_path = find_certificate(attendee_name, certificates_dir)
+                if render:
+                    # Rendered by the render pool ahead of time, or by
+                    # the worker right before sending
+                    save_dir = certificates_dir if save_pdf else None
+                    filename = check.filename(row)
+                    rendered = render_pool and render_pool.submit(
+                        render_certificate, attendee_name, save_dir, filename
+                    )
+                    yield certificate_job(
+                        key, attendee_name, email, render=True,
+                        save_dir=save_dir, rendered=rendered, filename=filename,
+                    )
+                    continue
                 
+                if check.collides(row):
+                    # Only this attendee's own file: the plain one may belong to
+                    # the other person with the same name
+                    cert_path = os.path.join(certificates_dir, check.filename(row))
+                    if not os.path.exists(cert_path):
+                        cert_path = None
+                else:
+                    cert_path = find_certificate(attendee_name, index)
                 if cert_path:
-                    # Send certificate
-                    if send_certificate(attendee_name, email, cert_path):
-                        success_count += 1
-                        # Add delay between emails to avoid spam filters
-                        if success_count % 5 == 0:  # Every 5 emails
-                            print("Waiting 30 seconds to avoid limits...")
-                            time.sleep(30)
-                        else:
-                            time.sleep(2)  # Short pause between emails
-                    else:
-                        error_count += 1
+                    yield certificate_job(key, attendee_name, email, cert_path)
                 else:
                     print(f"⚠️ Certificate not found for {attendee_name}")
                     not_found_count += 1
                     not_found_attendees.append(attendee_name)
+            except Exception as e:
+                # Report the row and go on with the others
+                print(f"❌ Error processing row {row.row_number} ({row.name}): {str(e)}")
+                traceback.print_exc()
+                row_error_count += 1
+    
+    def on_result(result):
+        nonlocal success_count, error_count
+        key = result.job.key
+        if result.ok:
+            success_count += 1
+            ledger.record(key, 'queued' if spool_path else 'sent')
+            return
+        error = str(result.error)
+        if result.outcome == 'quota':
+            # The sender already stopped; this one goes out on the next run
+            print("\n⚠️ Gmail sending limit reached")
+            print("Progress saved. Run the script again later to continue.")
+            ledger.record(key, 'retry', error=error, attempts=result.attempts)
+            return
+        if result.outcome == 'fatal':
+            # The sender already stopped: the account or the message itself
+            # is refused, so nothing else would go out either
+            print(f"\n❌ Sending stopped: {error}")
+            print("Check the account settings and run the script again.")
+            error_count += 1
+            ledger.record(key, 'retry', error=error, attempts=result.attempts)
+            return
+        print(f"❌ Error sending to {key}: {error}")
+        error_count += 1
+        if result.outcome == 'permanent':
+            # Never retried: the address will not accept the message
+            ledger.record(key, 'dead', error=error, attempts=result.attempts)
+            dead_letters.append((key, error))
+        else:
+            # Still failing after the retries of this run, or failed on
+            # our side: pending for the next run
+            ledger.record(key, 'retry', error=error, attempts=result.attempts)
+    
+    # Sending budgets of the account, shared by all the connections and
+    # kept between runs (SEND_LIMIT_PER_* in the config override them)
+    budgets = dict(
+        state_path=RATE_STATE_FILE,
+        # Same pace as the old fixed pauses; Gmail allows 500 a day
+        per_minute=8,
+        per_day=500,
+    )
+    # Transient failures (4xx, dropped connections) are retried with
+    # backoff; refused recipients (5xx) go to the dead letters
+    retry = retry_policy_from_config(config)
+    
+    if spool_path:
+        # Built and written at disk speed; the MTA does the delivery
+        account_pool = None
+        sender = AsyncSender(
+            None, connections=connections, pool=Spool(spool_path, spool_format),
+        )
+        print(f"📂 Writing the messages to {spool_path} ({spool_format})")
+    elif accounts:
+        # Each message goes out from the account with the most unused
+        # capacity; an account that hits its limit hands over to the others
+        account_pool = account_pool_from_configs(accounts, connections, **budgets)
+        sender = AsyncSender(
+            None, connections=account_pool.connections, retry=retry,
+            pool=account_pool,
+        )
+    else:
+        account_pool = None
+        limiter = rate_limiter_from_config(config, **budgets)
+        
+        # `connections` authenticated sessions, each one reused for many emails
+        sender = AsyncSender(
+            lambda: transport_from_config(config, limiter=limiter),
+            connections=connections,
+            limiter=limiter,
+            retry=retry,
+        )
+    render_pool = RenderPool(render_workers) if render_workers else None
+    try:
+        if render_pool:
+            # Keep a window of certificates rendering ahead of the senders
+            sender.send_all(read_ahead(jobs(), render_pool.window), on_result)
+        else:
+            sender.send_all(jobs(), on_result)
+    finally:
+        try:
+            if render_pool:
+                render_pool.close()
+        finally:
+            ledger.close()
     
     # Print summary
     print("\n--- Summary ---")
-    print(f"Certificates sent: {success_count}")
-    print(f"Errors: {error_count}")
+    if spool_path:
+        print(f"Certificates queued in {spool_path}: {success_count}")
+    else:
+        print(f"Certificates sent: {success_count}")
+    print(f"Skipped (already sent or queued): {skipped_count}")
+    print(f"Skipped (refused before): {dead_count}")
+    print(f"Skipped (duplicate rows): {duplicate_count}")
+    print(f"Skipped (invalid or suppressed address): {invalid_count}")
+    print(f"Errors: {error_count + row_error_count} (retries: {sender.retries})")
     print(f"Certificates not found: {not_found_count}")
+    print(f"Total sent to date: {len(ledger.keys('sent'))}")
+    print(f"Total queued to date: {len(ledger.keys('queued'))}")
+    
+    if account_pool:
+        print("\nAccounts:")
+        for line in account_pool.summary():
+            print(f"- {line}")
     
     if not_found_attendees:
         print("\nAttendees without certificates:")
         for attendee in not_found_attendees:
             print(f"- {attendee}")
+    
+    if dead_letters:
+        print("\nRefused permanently (not retried):")
+        for key, error in dead_letters:
+            print(f"- {key}: {error}")
 
 
 if __name__ == "__main__":
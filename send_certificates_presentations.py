@@ -1,78 +1,118 @@
-import csv
+import importlib
 import os
 import smtplib
 import sys
 import time
 import traceback
-import json
+from collections import defaultdict
+from functools import lru_cache
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from email.mime.application import MIMEApplication
+from email.utils import parseaddr
 
 import config_hostinger as config
 import email_template
+from accounts import account_pool_from_configs
+from address_check import AddressCheck, load_suppression_list
+from async_sender import AsyncSender, SendJob
+from certificate_index import CertificateIndex
+from cli import choice_option, int_option, option_value
+from message_factory import MessageFactory
+from names import match_key
+from pipeline import RenderPool, read_ahead
+from rate_limiter import rate_limiter_from_config
+from roster import load_roster
+from roster_check import RosterCheck
+from send_ledger import SendLedger
+from send_retry import retry_policy_from_config
+from smtp_transport import transport_from_config
+from spool import FORMATS as SPOOL_FORMATS, Spool
+
+# Roster and certificates of the congress
+CERTIFICATES_DIR = "congreso_neurociencias/certificados_expositores"
+CSV_PATH = "congreso_neurociencias/Presentadores Congreso.csv"
+
+# Roster columns by position: title, presenter, authors, email
+ROSTER_COLUMNS = {'title': 0, 'presenter': 1, 'authors': 2, 'email': 3}
+
+# Bucket levels of the sending budgets, kept between runs
+RATE_STATE_FILE = "congreso_neurociencias/.send_rate_state.json"
+
+# Addresses (or @domains) never to send to, one per line
+SUPPRESSION_FILE = "congreso_neurociencias/suppressed_addresses.txt"
+
+# Journal of the certificates already sent, and the JSON list it replaces
+LEDGER_FILE = "congreso_neurociencias/sent_certificates_hostinger.jsonl"
+LEGACY_LEDGER_FILE = "congreso_neurociencias/sent_certificates_hostinger.json"
 
 
 def normalize_name(name):
     """
     Normalize a name to match certificate filename format.
-    This mimics the eliminate_accents function used in certificate creation.
+    This is the match key of names.py, also used in certificate creation.
     """
     if not isinstance(name, str):
         return name
-        
-    name = name.lower().strip()
-    
-    # Replace accents - copied from utils.py:eliminate_accents
-    name = name.replace("á", "a")
-    name = name.replace("é", "e")
-    name = name.replace("í", "i")
-    name = name.replace("ó", "o")
-    name = name.replace("ú", "u")
-    name = name.replace("ü", "u")
-    name = name.replace("ñ", "n")
-    
-    # Strip spaces at the ends
-    return name.strip()
+    return match_key(name)
 
 
-def find_certificate(presenter_name, certificates_dir):
+def updated_ledger_key(key):
+    """A ledger key written with an older name normalization, updated."""
+    return ':'.join(normalize_name(part) for part in key.split(':', 1))
+
+
+def find_certificate(presenter_name, index):
     """
-    Find certificate PDF for a presenter.
-    Uses the exact same normalization as the certificate creation script.
+    Find certificate PDF for a presenter in the CertificateIndex of
+    certificates_dir (built with the same normalization as the certificate
+    creation script). Several matching certificates are reported and none
+    of them is sent.
     """
-    # Normalize the name exactly how it was normalized during certificate creation
-    normalized_name = normalize_name(presenter_name)
-    print(f"🔍 Looking for certificate for: '{presenter_name}'")
-    print(f"   Normalized name: '{normalized_name}'")
-    
-    # First try direct filename construction
-    expected_filename = f"certificado_{normalize_name(presenter_name)}.pdf"
-    expected_path = os.path.join(certificates_dir, expected_filename)
-    if os.path.exists(expected_path):
-        print(f"✅ Found by direct filename: {expected_filename}")
-        return expected_path
-    
-    # If direct construction fails, check all files
-    for filename in os.listdir(certificates_dir):
-        if filename.endswith('.pdf'):
-            # Extract name from filename (remove prefix and extension)
-            file_name = filename[len('certificado_'):-4].lower()
-            file_normalized = normalize_name(file_name)
-            
-            # Try exact match
-            if normalized_name == file_normalized:
-                print(f"✅ Found exact match: {filename}")
-                return os.path.join(certificates_dir, filename)
-                
-            # Try substring match
-            if normalized_name in file_normalized or file_normalized in normalized_name:
-                print(f"✅ Found substring match: {filename}")
-                return os.path.join(certificates_dir, filename)
+    match = index.lookup(presenter_name)
+    if match.kind == 'exact':
+        print(f"✅ Found certificate: {os.path.basename(match.path)}")
+    elif match.kind == 'words':
+        print(f"✅ Found by name words: {os.path.basename(match.path)}")
+    elif match.kind == 'ambiguous':
+        print(f"⚠️ Several certificates match '{presenter_name}':")
+        for path in match.candidates:
+            print(f"   - {os.path.basename(path)}")
+    else:
+        print(f"❌ No certificate found for '{presenter_name}'")
+    return match.path
+
+
+def render_certificate(presenter_name, title, authors, save_dir=None,
+                       filename=None):
+    """
+    Render the presenter's certificate in memory.
     
-    # If we reach here, no certificate was found
-    print(f"❌ No certificate found for '{presenter_name}'")
-    return None
+    Args:
+        presenter_name, title, authors: Values from the CSV
+        save_dir: If given, the PDF is also saved in this folder
+        filename: Filename of the certificate (see roster_check)
+    
+    Returns:
+        (certificate_path, pdf_bytes)
+    """
+    # Only needed when rendering on the fly
+    from create_exposition_certificates import (
+        congress_settings,
+        render_exposition_certificate,
+    )
+    
+    filename, pdf_bytes = render_exposition_certificate(
+        expositor_name=presenter_name,
+        title=title,
+        authors=authors,
+        filename=filename,
+        **congress_settings(),
+    )
+    certificate_path = os.path.join(save_dir or '', filename)
+    if save_dir:
+        with open(certificate_path, 'wb') as f:
+            f.write(pdf_bytes)
+    return certificate_path, pdf_bytes
 
 
 def test_smtp_connection():
@@ -99,55 +139,64 @@ def test_smtp_connection():
         return False
 
 
-def send_certificate(presenter_name, title, authors, email, certificate_path):
-    """Send certificate to presenter via email."""
+@lru_cache(maxsize=None)
+def message_factory():
+    """Headers and body template shared by every certificate email."""
+    return MessageFactory(
+        {
+            'From': config.EMAIL_FROM,
+            'Subject': email_template.SUBJECT,
+            'Reply-To': getattr(config, 'REPLY_TO', None),
+            # Additional header to reduce spam probability
+            'X-Mailer': "Python Email Sender",
+        },
+        email_template.BODY,
+        domain=parseaddr(config.EMAIL_FROM)[1].split('@')[1],
+    )
+
+
+def send_certificate(presenter_name, title, authors, email, certificate_path,
+                     certificate_data=None, transport=None):
+    """
+    Send certificate to presenter via email.
+    
+    certificate_data can hold the PDF already rendered in memory; then
+    certificate_path is only used for the attachment's filename. transport
+    is an open SmtpTransport to reuse; without it a one-off session is used.
+    Errors are printed and raised again, so the sender can classify them
+    (see send_retry.classify; a sending limit error stops the run).
+    """
     try:
         print(f"\nPreparing email to: {email}")
         
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = config.EMAIL_FROM
-        msg['To'] = email
-        msg['Subject'] = email_template.SUBJECT
-        if hasattr(config, 'REPLY_TO'):
-            msg['Reply-To'] = config.REPLY_TO
-        
-        # Add additional headers to reduce spam probability
-        msg['Message-ID'] = f"<{int(time.time())}@{config.EMAIL_FROM.split('@')[1]}>"
-        msg['X-Mailer'] = "Python Email Sender"
-        
-        # Attach message body
-        body = email_template.BODY.format(
-            presenter_name=presenter_name,
-            title=title,
-            authors=authors
-        )
-        msg.attach(MIMEText(body, 'html'))
-        
         # Attach certificate
         print(f"Attaching certificate: {os.path.basename(certificate_path)}")
         try:
-            with open(certificate_path, 'rb') as file:
-                attachment = MIMEApplication(file.read(), _subtype="pdf")
-                attachment.add_header(
-                    'Content-Disposition', 
-                    'attachment',
-                    filename=os.path.basename(certificate_path)
-                )
-                msg.attach(attachment)
-                print("✅ Certificate attached successfully")
+            if certificate_data is None:
+                with open(certificate_path, 'rb') as file:
+                    certificate_data = file.read()
         except Exception as e:
             print(f"❌ Error attaching certificate: {str(e)}")
             raise
         
-        # Connect to SMTP server and send
-        print("Connecting to SMTP server...")
-        with smtplib.SMTP_SSL(config.SMTP_SERVER, config.SMTP_PORT) as server:
-            print("Logging in...")
-            server.login(config.EMAIL_USER, config.EMAIL_PASSWORD)
-            print("Sending message...")
-            server.send_message(msg)
-            print("Message sent successfully")
+        # Create message (headers and template prepared once per run)
+        factory = message_factory()
+        message = factory.build(
+            email,
+            {'presenter_name': presenter_name, 'title': title, 'authors': authors},
+            certificate_data,
+            os.path.basename(certificate_path),
+        )
+        print("✅ Certificate attached successfully")
+        
+        # Send over the shared session (SSL)
+        print("Sending message...")
+        if transport is None:
+            with transport_from_config(config, use_ssl=True) as one_off:
+                one_off.sendmail(factory.sender, [email.strip()], message)
+        else:
+            transport.sendmail(factory.sender, [email.strip()], message)
+        print("Message sent successfully")
             
         print(f"✅ Certificate sent to {presenter_name} ({email})")
         return True
@@ -155,24 +204,48 @@ def send_certificate(presenter_name, title, authors, email, certificate_path):
     except smtplib.SMTPRecipientsRefused as e:
         print(f"❌ Recipient refused: {email}")
         print(f"SMTP Error: {str(e)}")
-        return False
+        raise
     
     except smtplib.SMTPException as e:
         print(f"❌ SMTP Error sending to {presenter_name} ({email})")
         print(f"SMTP Error: {str(e)}")
-        
-        # Check if it's a sending limit error
-        if "exceeded" in str(e).lower() or "limit" in str(e).lower():
-            print("⚠️ Hostinger sending limit reached. Save progress and try again later.")
-            raise e  # Re-raise to handle in the main function
-        
-        return False
+        raise
     
     except Exception as e:
         print(f"❌ Error sending to {presenter_name} ({email})")
         print(f"Error: {str(e)}")
         traceback.print_exc()
-        return False
+        raise
+
+
+def certificate_job(unique_id, presenter_name, title, authors, email,
+                    certificate_path=None, render=False, save_dir=None,
+                    rendered=None, filename=None):
+    """
+    Send job for one presenter (see async_sender), keyed by its ledger id.
+    
+    With render=True the certificate is rendered in memory by the worker
+    that sends it, or taken from rendered (a future of a RenderPool) when
+    given; otherwise certificate_path is attached.
+    """
+    def send(transport):
+        path, data = certificate_path, None
+        try:
+            if rendered is not None:
+                path, data = rendered.result()
+            elif render:
+                path, data = render_certificate(
+                    presenter_name, title, authors, save_dir, filename
+                )
+        except Exception as e:
+            # Kept pending in the ledger (see send_retry.classify)
+            print(f"❌ Error rendering certificate for {presenter_name}: {str(e)}")
+            raise
+        return send_certificate(
+            presenter_name, title, authors, email, path, data, transport
+        )
+    
+    return SendJob(unique_id, send)
 
 
 def send_test_email(test_email):
@@ -218,65 +291,64 @@ def send_test_email(test_email):
         return False
 
 
-def load_sent_certificates():
-    """Load the list of already sent certificates from JSON file."""
-    sent_file = "congreso_neurociencias/sent_certificates_hostinger.json"
-    if os.path.exists(sent_file):
-        try:
-            with open(sent_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"❌ Error loading sent certificates: {str(e)}")
-            return []
-    else:
-        return []
+def open_ledger():
+    """
+    Open the journal of sent certificates. Entries of the old JSON list
+    (sent_certificates_hostinger.json) are imported the first time, and
+    keys written with an older name normalization are updated.
+    """
+    ledger = SendLedger(LEDGER_FILE, legacy_json=LEGACY_LEDGER_FILE)
+    ledger.rekey(updated_ledger_key)
+    return ledger
 
 
-def save_sent_certificates(sent_list):
-    """Save the list of sent certificates to JSON file."""
-    sent_file = "congreso_neurociencias/sent_certificates_hostinger.json"
-    try:
-        with open(sent_file, 'w', encoding='utf-8') as f:
-            json.dump(sent_list, f, ensure_ascii=False, indent=2)
-        print(f"✅ Saved progress to {sent_file}")
-    except Exception as e:
-        print(f"❌ Error saving sent certificates: {str(e)}")
+def legacy_entries(ledger):
+    """
+    Index of the "presenter:title" keys imported from the old JSON list, for
+    the partial matching of is_certificate_sent: each word of a presenter's
+    name -> the (presenter, title) entries with that word, built once.
+    """
+    index = defaultdict(list)
+    for key in ledger.legacy_keys():
+        if ':' not in key:
+            continue
+        cert_name, cert_title = key.split(':', 1)
+        for word in set(cert_name.split()):
+            index[word].append((cert_name, cert_title))
+    return index
+
 
+def is_certificate_sent(presenter_name, title, ledger, legacy=None):
+    """
+    Check if the certificate has already been sent: by presenter and title,
+    or by presenter alone as in older ledger entries.
 
-def is_certificate_sent(presenter_name, title, sent_certificates):
-    """Check if the certificate has already been sent using flexible matching."""
+    Entries of the old JSON list (legacy, see legacy_entries) also match
+    partially, as the old script did: one name contains the other and one
+    title contains the other. Only the entries sharing a word with the
+    presenter's name are compared.
+    """
     normalized_presenter = normalize_name(presenter_name)
     normalized_title = normalize_name(title)
+    if (
+        f"{normalized_presenter}:{normalized_title}" in ledger
+        or normalized_presenter in ledger
+    ):
+        return True
+    if not legacy:
+        return False
     
-    # Create candidate IDs with different formats to try
-    candidate_ids = [
-        f"{normalized_presenter}:{normalized_title}",
-        # Alternative formats that might be in the JSON
-        normalized_presenter
-    ]
-    
-    # Try exact matching first
-    for cert_id in sent_certificates:
-        cert_id_norm = normalize_name(cert_id)
-        for candidate in candidate_ids:
-            if cert_id_norm == candidate:
-                return True
-    
-    # Try partial matching if exact match failed
-    for cert_id in sent_certificates:
-        cert_id_norm = normalize_name(cert_id)
-        
-        # Split the ID to compare name and title separately
-        if ':' in cert_id_norm:
-            cert_name, cert_title = cert_id_norm.split(':', 1)
-            
-            # Check if both name and at least part of the title match
-            name_match = (normalized_presenter in cert_name or 
-                         cert_name in normalized_presenter)
-            title_match = (normalized_title in cert_title or 
-                          cert_title in normalized_title)
-            if name_match and title_match:
-                return True
+    candidates = {
+        entry for word in set(normalized_presenter.split())
+        for entry in legacy.get(word, ())
+    }
+    for cert_name, cert_title in candidates:
+        name_match = (normalized_presenter in cert_name or
+                      cert_name in normalized_presenter)
+        title_match = (normalized_title in cert_title or
+                       cert_title in normalized_title)
+        if name_match and title_match:
+            return True
     
     return False
 
@@ -293,161 +365,278 @@ def main():
             test_smtp_connection()
         return
     
+    # Render each certificate in memory right before sending it instead of
+    # reading it from certificates_dir (--save-pdf also keeps a copy there)
+    render = "--render" in sys.argv[1:]
+    save_pdf = "--save-pdf" in sys.argv[1:]
+    
+    # Render in N processes ahead of the senders (implies --render)
+    render_workers = int_option("--render-workers", 0)
+    render = render or render_workers > 0
+    
+    # Number of SMTP connections sending in parallel (--connections 4)
+    connections = int_option("--connections", 1, minimum=1)
+    
+    # Spread the campaign over several accounts, each with its own budgets
+    # (--accounts config_gmail,config_hostinger); `connections` per account
+    accounts = [
+        importlib.import_module(name)
+        for name in option_value("--accounts", "").split(",") if name
+    ]
+    
+    # Write the messages to a spool for a local MTA instead of sending them
+    # (--spool DIR, --spool-format maildir|mbox|eml)
+    spool_path = option_value("--spool", None)
+    spool_format = choice_option("--spool-format", "maildir", SPOOL_FORMATS)
+    
+    # Addresses never to send to (--suppress FILE)
+    suppressed = load_suppression_list(option_value("--suppress", SUPPRESSION_FILE))
+    
     # Normal operation - send certificates
-    certificates_dir = "congreso_neurociencias/certificados_expositores"
-    csv_path = "congreso_neurociencias/Presentadores Congreso.csv"
+    certificates_dir = CERTIFICATES_DIR
+    csv_path = CSV_PATH
     
-    # First test SMTP connection
-    if not test_smtp_connection():
+    # First test SMTP connection (not needed to fill a spool)
+    if not spool_path and not test_smtp_connection():
         print("❌ SMTP connection failed. Check your credentials and settings.")
         return
     
     # Load previously sent certificates
-    sent_certificates = load_sent_certificates()
-    print(f"ℹ️ Found {len(sent_certificates)} previously sent certificates")
-    
-    # Debug: Print all loaded certificates to verify
-    print("\n--- Already sent certificates ---")
-    for cert in sent_certificates:
-        print(f"✓ {cert}")
-    print("--- End of sent certificates list ---\n")
+    ledger = open_ledger()
+    print(f"ℹ️ Found {len(ledger)} previously sent certificates")
+    legacy = legacy_entries(ledger)
     
     # Track results
     success_count = 0
     error_count = 0
+    # Rows that failed while building the jobs, counted apart because the
+    # jobs are built in another thread than the one running on_result
+    row_error_count = 0
     not_found_count = 0
     skipped_count = 0
+    dead_count = 0
+    duplicate_count = 0
+    invalid_count = 0
     not_found_presenters = []
+    dead_letters = []
+    
+    # Certificates folder listed once for the whole run
+    index = None if render else CertificateIndex(certificates_dir, normalize_name)
+    
+    def jobs():
+        """One send job per presenter not sent yet and with a certificate."""
+        nonlocal not_found_count, skipped_count, dead_count, row_error_count
+        nonlocal duplicate_count, invalid_count
+        # Delimiter and encoding detected in one pass; cached between runs
+        roster = load_roster(csv_path, ROSTER_COLUMNS)
+        print(f"ℹ️ {len(roster)} rows in {csv_path}")
+        
+        # Repeated rows are sent once; a presenter with several posters (or
+        # two presenters sharing a filename) has one file per certificate.
+        # Checked on the whole roster as read, exactly as
+        # create_exposition_certificates does, so both agree on the filenames
+        check = RosterCheck(
+            roster, name='presenter', email='email', fields=('title',),
+        )
+        check.report()
+        duplicate_count = len(check.duplicates)
+        # Every address checked offline: typos fixed, malformed and
+        # suppressed ones never reach the SMTP server
+        addresses = AddressCheck(
+            check.rows, name='presenter', suppressed=suppressed,
+        )
+        addresses.report()
+        invalid_count = len(addresses.rejected)
+        
+        for row in addresses.rows:
+            try:
+                # Cleanup any quotes in fields
+                title, presenter_name, authors, email = (
+                    value.strip('"').strip() for value in row[1:]
+                )
+                
+                # Create unique ID for this certificate
+                unique_id = f"{normalize_name(presenter_name)}:{normalize_name(title)}"
+                
+                # Use the more reliable matching function
+                print(f"Checking if already sent: {presenter_name} - {title}")
+                if is_certificate_sent(presenter_name, title, ledger, legacy):
+                    print(f"ℹ️ Already sent to {presenter_name} for '{title}'. Skipping.")
+                    skipped_count += 1
+                    continue
+                if ledger.status(unique_id) == 'queued':
+                    print(f"ℹ️ Already queued for {presenter_name} for '{title}'. Skipping.")
+                    skipped_count += 1
+                    continue
+                if ledger.status(unique_id) == 'dead':
+                    print(f"ℹ️ {email} refused the certificate before. Skipping.")
+                    dead_count += 1
+                    continue
+                
+                print(f"Processing: {presenter_name} <{email}>")
+                
+                # Find certificate (or let the worker render it)
+                filename = check.filename(row)
+                if render and title:
+                    save_dir = certificates_dir if save_pdf else None
+                    rendered = render_pool and render_pool.submit(
+                        render_certificate, presenter_name, title, authors,
+                        save_dir, filename,
+                    )
+                    yield certificate_job(
+                        unique_id, presenter_name, title, authors, email,
+                        render=True, save_dir=save_dir, rendered=rendered,
+                        filename=filename,
+                    )
+                    continue
+                
+                # The creation script skips rows without a title
+                if render:
+                    cert_path = None
+                elif check.collides(row):
+                    # Only this poster's own file: the plain one may hold
+                    # another certificate of the same name
+                    cert_path = os.path.join(certificates_dir, filename)
+                    if not os.path.exists(cert_path):
+                        cert_path = None
+                else:
+                    cert_path = find_certificate(presenter_name, index)
+                if cert_path:
+                    yield certificate_job(
+                        unique_id, presenter_name, title, authors, email,
+                        cert_path,
+                    )
+                else:
+                    print(f"⚠️ Certificate not found for {presenter_name}")
+                    not_found_count += 1
+                    not_found_presenters.append(presenter_name)
+            except Exception as e:
+                print(f"❌ Error processing row {row.row_number}: {str(e)}")
+                traceback.print_exc()
+                row_error_count += 1
+
+    def on_result(result):
+        nonlocal success_count, error_count
+        key = result.job.key
+        if result.ok:
+            success_count += 1
+            # Add to the ledger
+            ledger.record(key, 'queued' if spool_path else 'sent')
+            return
+        error = str(result.error)
+        if result.outcome == 'quota':
+            # The sender already stopped; this one goes out on the next run
+            print("\n⚠️ Hostinger sending limit reached")
+            print("Progress saved. Run the script again later to continue.")
+            ledger.record(key, 'retry', error=error, attempts=result.attempts)
+            return
+        if result.outcome == 'fatal':
+            # The sender already stopped: the account or the message itself
+            # is refused, so nothing else would go out either
+            print(f"\n❌ Sending stopped: {error}")
+            print("Check the account settings and run the script again.")
+            error_count += 1
+            ledger.record(key, 'retry', error=error, attempts=result.attempts)
+            return
+        print(f"❌ Error processing row: {error}")
+        error_count += 1
+        if result.outcome == 'permanent':
+            # Never retried: the address will not accept the message
+            ledger.record(key, 'dead', error=error, attempts=result.attempts)
+            dead_letters.append((key, error))
+        else:
+            # Still failing after the retries of this run, or failed on
+            # our side: pending for the next run
+            ledger.record(key, 'retry', error=error, attempts=result.attempts)
+    
+    # Sending budgets of the account, shared by all the connections and
+    # kept between runs (SEND_LIMIT_PER_* in the config override them)
+    budgets = dict(
+        state_path=RATE_STATE_FILE,
+        # Same pace as the old fixed pauses
+        per_minute=4,
+    )
+    # Transient failures (4xx, dropped connections) are retried with
+    # backoff; refused recipients (5xx) go to the dead letters
+    retry = retry_policy_from_config(config)
+    
+    if spool_path:
+        # Built and written at disk speed; the MTA does the delivery
+        account_pool = None
+        sender = AsyncSender(
+            None, connections=connections, pool=Spool(spool_path, spool_format),
+        )
+        print(f"📂 Writing the messages to {spool_path} ({spool_format})")
+    elif accounts:
+        # Each message goes out from the account with the most unused
+        # capacity; an account that hits its limit hands over to the others
+        account_pool = account_pool_from_configs(accounts, connections, **budgets)
+        sender = AsyncSender(
+            None, connections=account_pool.connections, retry=retry,
+            pool=account_pool,
+        )
+    else:
+        account_pool = None
+        limiter = rate_limiter_from_config(config, **budgets)
+        
+        # `connections` authenticated sessions, each one reused for many emails
+        sender = AsyncSender(
+            lambda: transport_from_config(config, use_ssl=True, limiter=limiter),
+            connections=connections,
+            limiter=limiter,
+            retry=retry,
+        )
     
     # Process CSV file
     print("\n--- Processing CSV file ---")
     
+    render_pool = RenderPool(render_workers) if render_workers else None
     try:
-        # Try opening the file as regular CSV
-        with open(csv_path, 'r', encoding='utf-8') as csvfile:
-            # First try reading as CSV with different delimiters
-            delimiter = None
-            for test_delimiter in [',', ';']:
-                try:
-                    print(f"Trying delimiter: '{test_delimiter}'")
-                    csvfile.seek(0)  # Reset file position
-                    reader = csv.reader(csvfile, delimiter=test_delimiter)
-                    header = next(reader)  # Skip header
-                    print(f"Header has {len(header)} columns: {header}")
-                    
-                    # Read first row to test
-                    first_row = next(reader)
-                    print(f"First row has {len(first_row)} columns: {first_row}")
-                    
-                    if len(first_row) >= 4:
-                        print(f"✅ Found valid delimiter: '{test_delimiter}'")
-                        delimiter = test_delimiter
-                        break
-                except Exception as e:
-                    print(f"Error with delimiter '{test_delimiter}': {str(e)}")
-                    continue
-            
-            if not delimiter:
-                print("❌ Could not determine CSV delimiter. Defaulting to ','")
-                delimiter = ','
-            
-            # Reset file and read with the correct delimiter
-            csvfile.seek(0)
-            reader = csv.reader(csvfile, delimiter=delimiter)
-            next(reader)  # Skip header
-            
-            # Process rows
-            for row in reader:
-                try:
-                    # Minimum required fields: title, presenter_name, authors, email
-                    if len(row) >= 4:
-                        title = row[0]
-                        presenter_name = row[1]
-                        authors = row[2]
-                        email = row[3]
-                    else:
-                        # Try to read raw line and parse manually
-                        print(f"Row too short, trying manual parsing: {row}")
-                        continue
-                    
-                    if not email.strip():
-                        print(f"⚠️ No email found for {presenter_name}. Skipping.")
-                        continue
-                    
-                    # Cleanup any quotes in fields
-                    title = title.strip('"').strip()
-                    presenter_name = presenter_name.strip('"').strip()
-                    authors = authors.strip('"').strip()
-                    email = email.strip('"').strip()
-                    
-                    # Create unique ID for this certificate
-                    unique_id = f"{normalize_name(presenter_name)}:{normalize_name(title)}"
-                    
-                    # Use the more reliable matching function
-                    print(f"Checking if already sent: {presenter_name} - {title}")
-                    if is_certificate_sent(presenter_name, title, sent_certificates):
-                        print(f"ℹ️ Already sent to {presenter_name} for '{title}'. Skipping.")
-                        skipped_count += 1
-                        continue
-                    
-                    print(f"Processing: {presenter_name} <{email}>")
-                    
-                    # Find certificate
-                    cert_path = find_certificate(presenter_name, certificates_dir)
-                    
-                    if cert_path:
-                        # Send certificate
-                        try:
-                            if send_certificate(
-                                presenter_name, title, authors, email, cert_path
-                            ):
-                                success_count += 1
-                                # Add to sent certificates list
-                                sent_certificates.append(unique_id)
-                                save_sent_certificates(sent_certificates)
-                                
-                                # Add delay between emails to avoid spam filters
-                                if success_count % 10 == 0:  # Every 10 emails
-                                    print("Waiting 60 seconds to avoid limits...")
-                                    time.sleep(60)
-                                else:
-                                    print("Waiting 20 seconds between emails...")
-                                    time.sleep(10)  # Longer pause between emails
-                            else:
-                                error_count += 1
-                        except smtplib.SMTPException as e:
-                            if "exceeded" in str(e).lower() or "limit" in str(e).lower():
-                                print("\n⚠️ Hostinger sending limit reached")
-                                print("Progress saved. Run the script again later to continue.")
-                                break
-                            else:
-                                error_count += 1
-                    else:
-                        print(f"⚠️ Certificate not found for {presenter_name}")
-                        not_found_count += 1
-                        not_found_presenters.append(presenter_name)
-                except Exception as e:
-                    print(f"❌ Error processing row: {str(e)}")
-                    traceback.print_exc()
-                    error_count += 1
-    
+        if render_pool:
+            # Keep a window of certificates rendering ahead of the senders
+            sender.send_all(read_ahead(jobs(), render_pool.window), on_result)
+        else:
+            sender.send_all(jobs(), on_result)
     except Exception as e:
         print(f"❌ Error processing CSV file: {str(e)}")
         traceback.print_exc()
         return
+    finally:
+        try:
+            if render_pool:
+                render_pool.close()
+        finally:
+            ledger.close()
     
     # Print summary
     print("\n--- Summary ---")
-    print(f"Certificates sent: {success_count}")
-    print(f"Skipped (already sent): {skipped_count}")
-    print(f"Errors: {error_count}")
+    if spool_path:
+        print(f"Certificates queued in {spool_path}: {success_count}")
+    else:
+        print(f"Certificates sent: {success_count}")
+    print(f"Skipped (already sent or queued): {skipped_count}")
+    print(f"Skipped (refused before): {dead_count}")
+    print(f"Skipped (duplicate rows): {duplicate_count}")
+    print(f"Skipped (invalid or suppressed address): {invalid_count}")
+    print(f"Errors: {error_count + row_error_count} (retries: {sender.retries})")
     print(f"Certificates not found: {not_found_count}")
-    print(f"Total sent to date: {len(sent_certificates)}")
+    print(f"Total sent to date: {len(ledger.keys('sent'))}")
+    print(f"Total queued to date: {len(ledger.keys('queued'))}")
+    
+    if account_pool:
+        print("\nAccounts:")
+        for line in account_pool.summary():
+            print(f"- {line}")
     
     if not_found_presenters:
         print("\nPresenters without certificates:")
         for presenter in not_found_presenters:
             print(f"- {presenter}")
+    
+    if dead_letters:
+        print("\nRefused permanently (not retried):")
+        for key, error in dead_letters:
+            print(f"- {key}: {error}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,198 @@
+"""
+Durable record of the certificates already sent.
+
+The ledger is an append-only journal (one JSON object per line) next to the
+roster. Every send appends one line instead of rewriting the whole file, and
+lookups go through a dict keyed by a hash of the recipient key, so checking
+whether a row was already sent takes constant time however long the
+campaign is.
+
+Lines are flushed as they are written, so a crash of the script loses
+nothing; they are fsync'ed to disk in batches (every sync_every records and
+on close) to survive a power loss without paying an fsync per email. A line
+cut short by a crash is skipped when the journal is read back. close()
+compacts the journal to one line per key when it holds many superseded
+lines.
+"""
+import hashlib
+import json
+import os
+import time
+
+
+def key_hash(key):
+    """Short stable hash of a recipient key."""
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:20]
+
+
+class SendLedger:
+    """
+    Journal of sent (or queued, or failed) certificates.
+
+    Args:
+        path: Journal file (.jsonl)
+        sync_every: Records written between two fsyncs
+        legacy_json: Optional JSON list of keys from the old ledger format,
+            imported as sent the first time the journal is created
+    """
+
+    def __init__(self, path, sync_every=20, legacy_json=None):
+        self.path = path
+        self.sync_every = sync_every
+        self.entries = {}
+        self.lines = 0
+        self.unsynced = 0
+        self.file = None
+        torn_line = False
+
+        if os.path.exists(path):
+            torn_line = self._load()
+        elif legacy_json and os.path.exists(legacy_json):
+            self._import_legacy(legacy_json)
+        self.file = open(path, 'a', encoding='utf-8')
+        if torn_line:
+            # Start the next record on its own line
+            self.file.write('\n')
+
+    def _load(self):
+        """Read the journal; True if its last line was cut short."""
+        line = '\n'
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Line cut short by a crash
+                    continue
+                if not isinstance(record, dict) or 'hash' not in record:
+                    # Valid JSON, but not a record (e.g. a stray list)
+                    continue
+                self.entries[record['hash']] = record
+                self.lines += 1
+        return not line.endswith('\n')
+
+    def _import_legacy(self, legacy_json):
+        try:
+            with open(legacy_json, 'r', encoding='utf-8') as f:
+                keys = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Could not import {legacy_json}: {str(e)}")
+            return
+        for key in keys:
+            self.entries[key_hash(key)] = {
+                'hash': key_hash(key), 'key': key, 'status': 'sent'
+            }
+        self.compact()
+        print(f"ℹ️ Imported {len(keys)} entries from {legacy_json}")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return self.status(key) == 'sent'
+
+    def status(self, key):
+        """
+        'sent', 'queued', 'retry' (transient failure, to be sent again),
+        'dead' (permanent failure, not retried) or None if the key was never
+        recorded.
+        """
+        record = self.entries.get(key_hash(key))
+        return record['status'] if record else None
+
+    def keys(self, status='sent'):
+        """Keys recorded with the given status, in journal order."""
+        return [r['key'] for r in self.entries.values() if r['status'] == status]
+
+    def legacy_keys(self):
+        """
+        Sent keys imported from the old JSON list. They were written by
+        hand or by older versions of the scripts, so callers may match them
+        more loosely than the keys recorded since.
+        """
+        # record() always stamps a time; imported entries have none
+        return [
+            r['key'] for r in self.entries.values()
+            if r['status'] == 'sent' and 'time' not in r
+        ]
+
+    def rekey(self, function):
+        """
+        Recompute the key of every entry with function (e.g. after the
+        name normalization changed) and compact the journal if any changed.
+
+        Returns:
+            Number of keys that changed
+        """
+        entries = {}
+        changed = 0
+        for record in self.entries.values():
+            key = function(record['key'])
+            if key != record['key']:
+                record = {**record, 'hash': key_hash(key), 'key': key}
+                changed += 1
+            entries[record['hash']] = record
+        if changed:
+            self.entries = entries
+            self.compact()
+        return changed
+
+    def record(self, key, status='sent', **info):
+        """
+        Append a record for key (replacing any earlier one).
+
+        Args:
+            key: Recipient key, e.g. "name:title"
+            status: 'sent', 'queued', 'retry' or 'dead'
+            **info: Extra JSON fields kept with the record (email, file, ...)
+        """
+        record = {
+            'hash': key_hash(key), 'key': key, 'status': status,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'), **info,
+        }
+        self.entries[record['hash']] = record
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+        self.lines += 1
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        """fsync the records written so far."""
+        if self.unsynced and not self.file.closed:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+
+    def compact(self):
+        """Rewrite the journal atomically with one line per key."""
+        reopen = self.file is not None and not self.file.closed
+        if reopen:
+            self.sync()
+            self.file.close()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in self.entries.values():
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.lines = len(self.entries)
+        if reopen:
+            self.file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        """Sync the journal and compact it if most lines are superseded."""
+        if self.file is None or self.file.closed:
+            return
+        self.sync()
+        self.file.close()
+        if self.lines > 2 * len(self.entries):
+            self.compact()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,154 @@
+"""
+Classification of failed sends and retry policy.
+
+Every failed send is classified from the SMTP reply it got, by reply code
+and enhanced status code (RFC 3463) first:
+
+- 'transient': 4xx replies, dropped connections and timeouts. The message
+  is retried later in the same run with exponential backoff and jitter;
+  if it still fails it stays pending in the ledger for the next run.
+- 'quota': the account's sending limit was reached (5.4.5 or 4.7.0, or a
+  reply that names the quota or sending limit). Sending stops; the rest
+  goes out on the next run.
+- 'permanent': the recipient was refused for good (5xx to RCPT TO, or
+  550/551/553 after DATA). Never retried; the recipient goes to the
+  ledger's dead-letter list.
+- 'fatal': the account or the message is refused (authentication, sender
+  address, any other 5xx). Every other message would fail the same way,
+  so sending stops and the message stays pending.
+- 'pending': errors without an SMTP reply that happened on our side (a
+  missing certificate, a rendering error, ...). Not retried in this run,
+  but never a dead letter either.
+"""
+import random
+import re
+import smtplib
+
+from rate_limiter import reply_codes
+
+# Enhanced status codes of a sending limit: 5.4.5 (Gmail's daily limit)
+# and 4.7.0 (rate limited, try again later)
+QUOTA_STATUSES = ('5.4.5', '4.7.0')
+
+# Fallback for servers without enhanced status codes
+QUOTA_WORDS = ('quota', 'sending limit', 'daily limit')
+
+# Replies to DATA that refuse the recipient rather than the message
+RECIPIENT_CODES = (550, 551, 553)
+
+_ENHANCED_STATUS = re.compile(r'\b([245]\.\d{1,3}\.\d{1,3})\b')
+
+
+class QuotaExceeded(smtplib.SMTPException):
+    """A sending limit was reached before sending (always 'quota')."""
+
+
+# Errors without a reply code that are worth retrying
+_TRANSIENT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+# Errors that concern the account rather than one recipient
+_FATAL_ERRORS = (
+    smtplib.SMTPAuthenticationError,
+    smtplib.SMTPSenderRefused,
+    smtplib.SMTPHeloError,
+    smtplib.SMTPNotSupportedError,
+)
+
+
+def _reply_text(error):
+    """Text of the SMTP replies carried by an smtplib exception."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        replies = [message for _, message in error.recipients.values()]
+    elif isinstance(error, smtplib.SMTPResponseException):
+        replies = [error.smtp_error]
+    else:
+        replies = [str(error)]
+    return ' '.join(
+        reply.decode('utf-8', 'replace') if isinstance(reply, bytes) else str(reply)
+        for reply in replies
+    )
+
+
+def is_quota_error(error):
+    """True if the SMTP reply says the account's sending limit was reached."""
+    if isinstance(error, QuotaExceeded):
+        return True
+    if (not isinstance(error, smtplib.SMTPException)
+            or isinstance(error, smtplib.SMTPAuthenticationError)):
+        # A refused login is never a sending limit, even with a 4.7.0 reply
+        return False
+    text = _reply_text(error)
+    statuses = _ENHANCED_STATUS.findall(text)
+    if statuses:
+        return any(status in QUOTA_STATUSES for status in statuses)
+    text = text.lower()
+    return any(word in text for word in QUOTA_WORDS)
+
+
+def classify(error):
+    """
+    Classify a failed send.
+
+    Args:
+        error: Exception raised by the send, or None if it just failed
+
+    Returns:
+        'transient', 'quota', 'permanent', 'fatal' or 'pending'
+    """
+    if error is None:
+        return 'pending'
+    if is_quota_error(error):
+        return 'quota'
+    codes = reply_codes(error)
+    if codes and all(400 <= code < 500 for code in codes):
+        # Even a refused sender or login is only temporary with a 4xx reply
+        return 'transient'
+    if isinstance(error, _FATAL_ERRORS):
+        return 'fatal'
+    if codes:
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return 'permanent'
+        if isinstance(error, smtplib.SMTPDataError) and all(
+            code in RECIPIENT_CODES for code in codes
+        ):
+            return 'permanent'
+        return 'fatal'
+    if isinstance(error, _TRANSIENT_ERRORS):
+        return 'transient'
+    return 'pending'
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with jitter for transient failures.
+
+    Args:
+        max_attempts: Attempts per message in one run (the first included)
+        base_delay: Delay before the first retry (seconds)
+        max_delay: Longest delay between two attempts (seconds)
+        jitter: Fraction of the delay that is randomized, so messages that
+            failed together are not retried all at once
+    """
+
+    def __init__(self, max_attempts=4, base_delay=30, max_delay=600, jitter=0.5):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def delay(self, attempt):
+        """Seconds to wait after the given (1-based) failed attempt."""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+
+def retry_policy_from_config(config):
+    """
+    RetryPolicy from a config module: SEND_RETRY_ATTEMPTS (default 4),
+    SEND_RETRY_DELAY (30 s) and SEND_RETRY_MAX_DELAY (600 s).
+    """
+    return RetryPolicy(
+        max_attempts=getattr(config, 'SEND_RETRY_ATTEMPTS', 4),
+        base_delay=getattr(config, 'SEND_RETRY_DELAY', 30),
+        max_delay=getattr(config, 'SEND_RETRY_MAX_DELAY', 600),
+    )
@@ -0,0 +1,280 @@
+"""
+Local SMTP stand-in for testing and benchmarking the sending scripts.
+
+SmtpSink is a small threaded SMTP server that accepts any login and discards
+(or keeps) the messages it receives. It speaks plain SMTP with STARTTLS, or
+SMTP over SSL, using a self-signed certificate generated with openssl, so
+the scripts can talk to it exactly as they talk to Gmail or Hostinger. It
+can add latency to every message and answer a fraction of the recipients
+with a temporary (4xx) or permanent (5xx) failure.
+
+Run it in-process:
+
+    with SmtpSink(latency=0.05, temp_fail_rate=0.02) as sink:
+        ... send to ('127.0.0.1', sink.port) ...
+    print(sink.stats)
+
+or on localhost:
+
+    python smtp_sink.py --port 1025 --latency 0.05
+"""
+import argparse
+import base64
+import os
+import random
+import socketserver
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+
+
+def self_signed_certificate():
+    """
+    Paths of a self-signed certificate and key for localhost, created once
+    with openssl in the temp directory.
+    """
+    folder = os.path.join(tempfile.gettempdir(), 'smtp_sink_cert')
+    certfile = os.path.join(folder, 'cert.pem')
+    keyfile = os.path.join(folder, 'key.pem')
+    if not os.path.exists(certfile):
+        os.makedirs(folder, exist_ok=True)
+        try:
+            subprocess.run(
+                ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+                 '-subj', '/CN=localhost', '-days', '365',
+                 '-keyout', keyfile, '-out', certfile],
+                check=True, capture_output=True,
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise RuntimeError(
+                "openssl is needed to create the sink's TLS certificate "
+                "(or pass certfile and keyfile)"
+            ) from e
+    return certfile, keyfile
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    """One client session."""
+
+    def setup(self):
+        if self.server.sink.use_ssl:
+            self.request = self.server.sink.tls_context.wrap_socket(
+                self.request, server_side=True
+            )
+        super().setup()
+        self.tls = self.server.sink.use_ssl
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+        self.wfile.flush()
+
+    def readline(self):
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError("client closed the connection")
+        return line.decode('utf-8', 'replace').rstrip('\r\n')
+
+    def start_tls(self):
+        self.reply("220 Ready to start TLS")
+        self.connection = self.server.sink.tls_context.wrap_socket(
+            self.connection, server_side=True
+        )
+        self.rfile = self.connection.makefile('rb', self.rbufsize)
+        self.wfile = self.connection.makefile('wb', self.wbufsize)
+        self.tls = True
+
+    def handle(self):
+        sink = self.server.sink
+        sink._count('connections')
+        self.reply("220 localhost SMTP sink ready")
+        recipients = []
+        try:
+            while True:
+                line = self.readline()
+                command = line[:4].upper()
+                if command in ('EHLO', 'HELO'):
+                    self.reply("250-localhost")
+                    if sink.starttls and not self.tls:
+                        self.reply("250-STARTTLS")
+                    self.reply("250-AUTH PLAIN LOGIN")
+                    self.reply("250-8BITMIME")
+                    self.reply("250 SIZE 52428800")
+                elif command == 'STAR' and sink.starttls and not self.tls:
+                    self.start_tls()
+                elif command == 'AUTH':
+                    if line.upper().startswith('AUTH LOGIN'):
+                        self.reply("334 " + base64.b64encode(b"Username:").decode())
+                        self.readline()
+                        self.reply("334 " + base64.b64encode(b"Password:").decode())
+                        self.readline()
+                    self.reply("235 Authentication successful")
+                elif command == 'MAIL':
+                    recipients = []
+                    self.reply("250 OK")
+                elif command == 'RCPT':
+                    code = sink._recipient_reply()
+                    if code == 250:
+                        recipients.append(line[8:].strip())
+                        self.reply("250 OK")
+                    elif code == 451:
+                        sink._count('temp_failures')
+                        self.reply("451 4.7.1 Too many messages, slow down")
+                    else:
+                        sink._count('rejections')
+                        self.reply("550 5.1.1 Recipient rejected")
+                elif command == 'DATA':
+                    if not recipients:
+                        self.reply("554 No valid recipients")
+                        continue
+                    self.reply("354 End data with <CR><LF>.<CR><LF>")
+                    size = 0
+                    lines = [] if sink.keep_messages else None
+                    while True:
+                        data = self.rfile.readline()
+                        if not data or data in (b'.\r\n', b'.\n'):
+                            break
+                        if data.startswith(b'..'):
+                            data = data[1:]
+                        size += len(data)
+                        if lines is not None:
+                            lines.append(data)
+                    if sink.latency:
+                        time.sleep(sink.latency)
+                    sink._received(recipients, size, lines)
+                    recipients = []
+                    self.reply("250 OK queued")
+                elif command == 'RSET':
+                    recipients = []
+                    self.reply("250 OK")
+                elif command == 'NOOP':
+                    self.reply("250 OK")
+                elif command == 'QUIT':
+                    self.reply("221 Bye")
+                    return
+                else:
+                    self.reply("502 Command not implemented")
+        except (ConnectionError, OSError, ssl.SSLError):
+            return
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SmtpSink:
+    """
+    Threaded local SMTP server.
+
+    Args:
+        host: Interface to listen on
+        port: Port (0 picks a free one, see .port)
+        use_ssl: SMTP over SSL (like Hostinger on 465) instead of plain SMTP
+        starttls: Offer STARTTLS on plain connections (like Gmail on 587)
+        latency: Seconds added before accepting each message
+        temp_fail_rate: Fraction of recipients answered with 451
+        reject_rate: Fraction of recipients answered with 550
+        keep_messages: Keep the raw messages in .messages
+        seed: Seed of the failure injection
+        certfile, keyfile: TLS certificate (self-signed one if None)
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, use_ssl=False, starttls=True,
+                 latency=0.0, temp_fail_rate=0.0, reject_rate=0.0,
+                 keep_messages=False, seed=None, certfile=None, keyfile=None):
+        self.use_ssl = use_ssl
+        self.starttls = starttls and not use_ssl
+        self.latency = latency
+        self.temp_fail_rate = temp_fail_rate
+        self.reject_rate = reject_rate
+        self.keep_messages = keep_messages
+        self.messages = []
+        self.stats = {
+            'connections': 0, 'messages': 0, 'bytes': 0,
+            'temp_failures': 0, 'rejections': 0,
+        }
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+
+        self.tls_context = None
+        if use_ssl or starttls:
+            if certfile is None:
+                certfile, keyfile = self_signed_certificate()
+            self.tls_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            self.tls_context.load_cert_chain(certfile, keyfile)
+
+        self.server = _Server((host, port), _SmtpHandler)
+        self.server.sink = self
+        self.host, self.port = self.server.server_address[:2]
+        self.thread = None
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def _recipient_reply(self):
+        with self.lock:
+            roll = self.random.random()
+        if roll < self.reject_rate:
+            return 550
+        if roll < self.reject_rate + self.temp_fail_rate:
+            return 451
+        return 250
+
+    def _received(self, recipients, size, lines):
+        with self.lock:
+            self.stats['messages'] += 1
+            self.stats['bytes'] += size
+            if lines is not None:
+                self.messages.append((recipients, b''.join(lines)))
+
+    def start(self):
+        """Serve in a background thread."""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP sink for testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--ssl", action="store_true",
+                        help="SMTP over SSL instead of plain SMTP with STARTTLS")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds added to every message")
+    parser.add_argument("--temp-fail-rate", type=float, default=0.0,
+                        help="fraction of recipients answered with 451")
+    parser.add_argument("--reject-rate", type=float, default=0.0,
+                        help="fraction of recipients answered with 550")
+    args = parser.parse_args()
+
+    sink = SmtpSink(
+        args.host, args.port, use_ssl=args.ssl, latency=args.latency,
+        temp_fail_rate=args.temp_fail_rate, reject_rate=args.reject_rate,
+    )
+    mode = "SSL" if args.ssl else "STARTTLS"
+    print(f"📬 SMTP sink listening on {sink.host}:{sink.port} ({mode}). Ctrl+C to stop.")
+    try:
+        sink.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.server.server_close()
+        print(f"\n{sink.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Persistent SMTP transport shared by the sending scripts.
+
+Instead of connecting, starting TLS and logging in for every recipient, an
+SmtpTransport keeps an authenticated session open across messages. It
+reconnects when the server drops the connection, recycles the session after
+a configurable number of messages and sends RSET after a failed recipient so
+the same session can keep going. SmtpPool holds several of them for
+concurrent senders.
+"""
+import queue
+import smtplib
+
+
+# Errors after which the session is still alive but the transaction must
+# be reset before the next message
+_TRANSACTION_ERRORS = (
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+    smtplib.SMTPDataError,
+)
+
+
+class SmtpTransport:
+    """
+    One authenticated SMTP session reused for many messages.
+
+    Args:
+        server: SMTP host
+        port: SMTP port
+        user: Login user
+        password: Login password
+        use_ssl: True for SMTP over SSL (e.g. port 465), False for STARTTLS
+        max_messages: Messages sent before the session is recycled
+        timeout: Socket timeout in seconds
+        limiter: Optional RateLimiter told about every sent message and
+            every refused one, so it can slow down on 4xx replies
+    """
+
+    def __init__(self, server, port, user, password, use_ssl=False,
+                 max_messages=100, timeout=60, limiter=None):
+        self.server = server
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_ssl = use_ssl
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self.limiter = limiter
+        self.connection = None
+        self.session_messages = 0
+        self.connections_opened = 0
+
+    def connect(self):
+        """Open and authenticate a new session (closing any previous one)."""
+        self.close()
+        if self.use_ssl:
+            connection = smtplib.SMTP_SSL(self.server, self.port, timeout=self.timeout)
+        else:
+            connection = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+            connection.starttls()
+        try:
+            connection.login(self.user, self.password)
+        except (smtplib.SMTPException, OSError):
+            # A temporary login failure is retried on a new session
+            connection.close()
+            raise
+        self.connection = connection
+        self.session_messages = 0
+        self.connections_opened += 1
+        return connection
+
+    def close(self):
+        """Close the session if one is open."""
+        if self.connection is None:
+            return
+        try:
+            self.connection.quit()
+        except (smtplib.SMTPException, OSError):
+            self.connection.close()
+        self.connection = None
+
+    def _deliver(self, send):
+        # A session dropped by the server (idle timeout, restart) is only
+        # detected when used, so retry once on a fresh connection
+        for attempt in range(2):
+            connection = self.connection or self.connect()
+            try:
+                result = send(connection)
+            except smtplib.SMTPServerDisconnected:
+                self.connection = None
+                if attempt:
+                    raise
+                print("⚠️ SMTP session lost, reconnecting...")
+                continue
+            except _TRANSACTION_ERRORS as e:
+                self.reset()
+                if self.limiter:
+                    self.limiter.observe(e)
+                raise
+            if self.limiter:
+                self.limiter.observe()
+            self.session_messages += 1
+            if self.session_messages >= self.max_messages:
+                self.close()
+            return result
+
+    def send_message(self, msg):
+        """Send an email.message.Message over the shared session."""
+        return self._deliver(lambda connection: connection.send_message(msg))
+
+    def sendmail(self, from_addr, to_addrs, message):
+        """Send an already formatted message over the shared session."""
+        return self._deliver(
+            lambda connection: connection.sendmail(from_addr, to_addrs, message)
+        )
+
+    def reset(self):
+        """RSET the current transaction; drop the session if that fails."""
+        if self.connection is None:
+            return
+        try:
+            self.connection.rset()
+        except (smtplib.SMTPException, OSError):
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def transport_from_config(config, use_ssl=False, limiter=None):
+    """
+    Create an SmtpTransport from a config module (config_gmail or
+    config_hostinger). SMTP_MAX_MESSAGES in the config sets how many
+    messages a session sends before it is recycled.
+    """
+    return SmtpTransport(
+        config.SMTP_SERVER,
+        config.SMTP_PORT,
+        config.EMAIL_USER,
+        config.EMAIL_PASSWORD,
+        use_ssl=use_ssl,
+        max_messages=getattr(config, 'SMTP_MAX_MESSAGES', 100),
+        limiter=limiter,
+    )
+
+
+class SmtpPool:
+    """
+    A fixed number of SmtpTransport sessions shared between threads.
+
+    Each send borrows a session, so at most `size` messages are in flight
+    and every session is reused for many messages.
+    """
+
+    def __init__(self, transport_factory, size=1):
+        self.transports = [transport_factory() for _ in range(size)]
+        self.idle = queue.Queue()
+        for transport in self.transports:
+            self.idle.put(transport)
+
+    def send_message(self, msg):
+        transport = self.idle.get()
+        try:
+            return transport.send_message(msg)
+        finally:
+            self.idle.put(transport)
+
+    def sendmail(self, from_addr, to_addrs, message):
+        transport = self.idle.get()
+        try:
+            return transport.sendmail(from_addr, to_addrs, message)
+        finally:
+            self.idle.put(transport)
+
+    def close(self):
+        # Close every session, even if closing one of them fails
+        errors = []
+        for transport in self.transports:
+            try:
+                transport.close()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
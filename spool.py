@@ -0,0 +1,97 @@
+"""
+Spool output for very large campaigns.
+
+Instead of delivering over SMTP, a Spool writes every fully built message
+(the same bytes send_certificate would send) to disk, where a local MTA or
+relay (Postfix, msmtp, a provider's bulk uploader, ...) delivers them with
+its own queueing. Writing runs at disk speed, so the Python process is no
+longer what limits delivery.
+
+Formats:
+
+- 'maildir': one file per message in DIR/new, written to DIR/tmp first and
+  renamed, so a reader never sees half a message
+- 'mbox': all the messages appended to one mbox file
+  (both with LF line endings, as local mail tools expect them: the CRLF
+  of the built message is converted when it is stored)
+- 'eml': one DIR/<n>.eml file per message, with CRLF line endings as sent
+
+A Spool has the sendmail interface of SmtpPool, so AsyncSender can use it
+as its pool:
+
+    with Spool("spool", "maildir") as spool:
+        AsyncSender(None, connections=4, pool=spool).send_all(jobs)
+"""
+import itertools
+import mailbox
+import os
+import threading
+
+FORMATS = ('maildir', 'mbox', 'eml')
+
+
+class Spool:
+    """
+    Write messages to a Maildir, an mbox file or a folder of .eml files.
+
+    Args:
+        path: Maildir or .eml folder, or mbox file (created if missing)
+        format: 'maildir', 'mbox' or 'eml'
+    """
+
+    def __init__(self, path, format='maildir'):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown spool format '{format}', use one of {FORMATS}")
+        self.path = path
+        self.format = format
+        self.lock = threading.Lock()
+        self.written = 0
+        self.box = None
+        if format in ('maildir', 'mbox'):
+            folder = os.path.dirname(os.path.abspath(path))
+            os.makedirs(folder, exist_ok=True)
+        if format == 'maildir':
+            self.box = mailbox.Maildir(path, create=True)
+        elif format == 'mbox':
+            self.box = mailbox.mbox(path, create=True)
+            self.box.lock()
+        else:
+            os.makedirs(path, exist_ok=True)
+            # Continue after the files of an earlier run
+            existing = [
+                int(name[:-4]) for name in os.listdir(path)
+                if name.endswith('.eml') and name[:-4].isdigit()
+            ]
+            self.numbers = itertools.count(max(existing, default=0) + 1)
+
+    def sendmail(self, from_addr, to_addrs, message):
+        """Spool one message (the envelope is taken from its headers)."""
+        if self.format == 'eml':
+            with self.lock:
+                number = next(self.numbers)
+            path = os.path.join(self.path, f"{number:06d}.eml")
+            with open(path, 'xb') as f:
+                f.write(message)
+        else:
+            # mailbox writes the bytes as they are: store them with LF only.
+            # Maildir writes each message to tmp/ and renames it into new/
+            message = message.replace(b'\r\n', b'\n')
+            with self.lock:
+                self.box.add(message)
+        with self.lock:
+            self.written += 1
+        return {}
+
+    def close(self):
+        """Flush and unlock the mbox file."""
+        if self.format == 'mbox' and self.box is not None:
+            self.box.flush()
+            self.box.unlock()
+            self.box.close()
+            self.box = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,62 @@
+import pytest
+
+from certificate_index import CertificateIndex
+from names import match_key
+
+
+@pytest.fixture
+def index(tmp_path):
+    for name in ['ana maria perez', 'jose lopez', 'mariana gomez', 'luis diaz',
+                 'luis diaz garcia', 'juan perez']:
+        (tmp_path / f'certificado_{name}.pdf').write_bytes(b'%PDF')
+    (tmp_path / 'notes.txt').write_text('not a certificate')
+    return CertificateIndex(str(tmp_path), match_key)
+
+
+def names(match):
+    return sorted(path.rsplit('/', 1)[-1] for path in match.candidates)
+
+
+def test_lists_only_pdfs(index):
+    assert len(index) == 6
+
+
+def test_exact_match_ignores_case_accents_and_spaces(index):
+    match = index.lookup('  José   LÓPEZ ')
+    assert match.kind == 'exact'
+    assert match.path.endswith('certificado_jose lopez.pdf')
+
+
+def test_word_subset_match(index):
+    match = index.lookup('Ana Pérez')
+    assert match.kind == 'words'
+    assert match.path.endswith('certificado_ana maria perez.pdf')
+
+
+def test_reordered_words_match(index):
+    match = index.lookup('Gómez Mariana')
+    assert match.kind == 'words'
+    assert match.path.endswith('certificado_mariana gomez.pdf')
+
+
+def test_substring_of_a_word_does_not_match(index):
+    # The old substring search sent mariana's certificate to "Ana"
+    assert index.lookup('Ana Gomez').kind == 'missing'
+
+
+def test_exact_match_wins_over_longer_names(index):
+    match = index.lookup('Luis Díaz')
+    assert match.kind == 'exact'
+    assert match.path.endswith('certificado_luis diaz.pdf')
+
+
+def test_several_matches_are_ambiguous(index):
+    match = index.lookup('Pérez')
+    assert match.kind == 'ambiguous'
+    assert match.path is None
+    assert names(match) == ['certificado_ana maria perez.pdf', 'certificado_juan perez.pdf']
+
+
+def test_missing(index):
+    assert index.lookup('Eva Ruiz') == (None, 'missing', [])
+    assert index.lookup('   ').kind == 'missing'
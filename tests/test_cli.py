@@ -0,0 +1,32 @@
+import pytest
+
+from cli import choice_option, int_option, option_value
+
+ARGV = ['send.py', '--connections', '4', '--spool-format', 'mbox', '--render']
+
+
+def test_option_value():
+    assert option_value('--connections', 1, ARGV) == '4'
+    assert option_value('--accounts', '', ARGV) == ''
+
+
+def test_option_without_value_exits():
+    with pytest.raises(SystemExit, match='needs a value'):
+        option_value('--render', None, ARGV)
+
+
+def test_int_option():
+    assert int_option('--connections', 1, minimum=1, argv=ARGV) == 4
+    assert int_option('--render-workers', 0, argv=ARGV) == 0
+
+
+@pytest.mark.parametrize('value', ['four', '0', '-2', '1.5'])
+def test_bad_int_option_exits(value):
+    with pytest.raises(SystemExit, match='whole number'):
+        int_option('--connections', 1, minimum=1, argv=['send.py', '--connections', value])
+
+
+def test_choice_option():
+    assert choice_option('--spool-format', 'maildir', ('maildir', 'mbox'), ARGV) == 'mbox'
+    with pytest.raises(SystemExit, match='one of'):
+        choice_option('--spool-format', 'maildir', ('maildir', 'eml'), ARGV)
@@ -0,0 +1,54 @@
+import re
+from email import message_from_bytes, policy
+
+from message_factory import MessageFactory, compile_template, render_template
+
+HEADERS = {
+    'From': 'Congreso de Neurociencias <certificados@example.com>',
+    'Subject': 'Certificado de participación',
+    'Reply-To': 'info@example.com',
+}
+TEMPLATE = "<p>Hola {attendee_name},</p>\n<p>Adjuntamos tu certificado.</p>\n"
+
+
+def build(**kwargs):
+    factory = MessageFactory(HEADERS, TEMPLATE, domain='example.com')
+    return factory.build(
+        'José Pérez <jose@example.com>', {'attendee_name': 'José Pérez'},
+        attachment=b'%PDF-1.4\n' + bytes(range(256)) * 20,
+        filename='certificado_jose perez.pdf', **kwargs,
+    )
+
+
+def test_every_line_ends_with_crlf():
+    message = build()
+    assert message.endswith(b'\r\n')
+    assert not re.search(rb'(?<!\r)\n', message)
+    assert b'\r\r' not in message
+    assert all(len(line) <= 998 for line in message.split(b'\r\n'))
+
+
+def test_message_parses_back():
+    message = message_from_bytes(build(), policy=policy.SMTP)
+    assert message['Subject'] == 'Certificado de participación'
+    assert message['To'] == 'José Pérez <jose@example.com>'
+    assert message['Message-ID'].endswith('@example.com>')
+
+    body, attachment = message.iter_parts()
+    assert body.get_content() == TEMPLATE.format(attendee_name='José Pérez')
+    assert attachment.get_filename() == 'certificado_jose perez.pdf'
+    assert attachment.get_content() == b'%PDF-1.4\n' + bytes(range(256)) * 20
+
+
+def test_bcc_recipient_header():
+    message = message_from_bytes(build(recipient_header='Bcc'), policy=policy.SMTP)
+    assert message['To'] is None
+    assert message['Bcc'] == 'José Pérez <jose@example.com>'
+
+
+def test_compiled_template_matches_format():
+    template = "{name!r} tiene {count:03d} certificados, {name}"
+    fields = {'name': 'Ana', 'count': 7}
+    parts = compile_template(template)
+    assert render_template(parts, fields) == template.format(**fields)
+    assert compile_template("{person.name}") is None
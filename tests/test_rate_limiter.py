@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import pytest
+
+import rate_limiter
+from accounts import daily_capacity
+from rate_limiter import RateLimiter, RateLimitExhausted
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, 'time', clock)
+    return clock
+
+
+def send(limiter, count):
+    """Reserve count messages, returning how many were allowed."""
+    return sum(1 for _ in range(count) if limiter.reserve() == 0)
+
+
+def test_daily_budget_is_a_hard_limit(clock):
+    limiter = RateLimiter(per_day=5)
+    assert send(limiter, 5) == 5
+    assert limiter.reserve() > 0
+    assert limiter.remaining() == 0
+
+    # Idle time does not add to the budget until the first send is a day old
+    clock.now += 23 * 3600
+    assert limiter.reserve() > 0
+    clock.now += 3600
+    assert send(limiter, 10) == 5
+
+
+def test_window_allows_no_more_than_the_budget_in_any_day(clock):
+    limiter = RateLimiter(per_day=100, per_minute=1000)
+    sent = 0
+    for _ in range(48):
+        sent += send(limiter, 100)
+        clock.now += 1800
+    # A bucket refilled continuously would have let about twice as many
+    # through in the same 24 h
+    assert sent == 100
+
+
+def test_acquire_raises_when_the_budget_is_used_up(clock):
+    limiter = RateLimiter(per_day=2, max_wait=900)
+    asyncio.run(limiter.acquire())
+    asyncio.run(limiter.acquire())
+    with pytest.raises(RateLimitExhausted):
+        asyncio.run(limiter.acquire())
+
+
+def test_send_times_are_kept_between_runs(clock, tmp_path):
+    state_path = str(tmp_path / 'state.json')
+    limiter = RateLimiter(per_day=5, per_minute=10, state_path=state_path, account='a')
+    assert send(limiter, 3) == 3
+    limiter.save()
+
+    clock.now += 3600
+    limiter = RateLimiter(per_day=5, per_minute=10, state_path=state_path, account='a')
+    assert send(limiter, 5) == 2
+
+
+def test_old_bucket_state_counts_as_sent(clock, tmp_path):
+    state_path = tmp_path / 'state.json'
+    state_path.write_text(json.dumps(
+        {'a': {'per_day': {'tokens': 1.0, 'updated': clock.now - 3600}}}
+    ))
+    limiter = RateLimiter(per_day=5, state_path=str(state_path), account='a')
+    assert send(limiter, 5) == 1
+
+
+def test_per_minute_bucket_refills(clock):
+    limiter = RateLimiter(per_minute=2)
+    assert send(limiter, 3) == 2
+    clock.now += 30
+    assert send(limiter, 2) == 1
+
+
+def test_throttle_halves_the_rate(clock):
+    limiter = RateLimiter(per_minute=60, cooldown=0)
+    limiter.throttle()
+    assert limiter.factor == 0.5
+    for _ in range(limiter.recover_after):
+        limiter.success()
+    assert limiter.factor == 1.0
+
+
+def test_daily_capacity_counts_every_budget():
+    assert daily_capacity(RateLimiter(per_minute=8, per_day=500)) == 500
+    assert daily_capacity(RateLimiter(per_hour=10)) == 240
+    assert daily_capacity(RateLimiter()) is None
@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+from create_assistant_certificates import iter_changed_jobs
+from render_manifest import (
+    MANIFEST_FILENAME,
+    RenderManifest,
+    certificate_fingerprint,
+    file_digest,
+)
+
+
+class FakeOutput:
+    options = {'quality': 75}
+
+
+@pytest.fixture
+def settings(tmp_path):
+    template = tmp_path / 'template.png'
+    font = tmp_path / 'font.ttf'
+    template.write_bytes(b'template v1')
+    font.write_bytes(b'font')
+    file_digest.cache_clear()
+    yield {
+        'certificate_template': str(template),
+        'font_path': str(font),
+        'font_size': 60,
+        'save_path': str(tmp_path),
+        'output': FakeOutput(),
+    }
+    file_digest.cache_clear()
+
+
+def render(jobs, settings, folder, force=False):
+    """One run of the creator: (rendered, skipped) names."""
+    manifest = RenderManifest(str(folder))
+    fingerprints = {}
+    skipped = []
+    rendered = []
+    for row_number, name, filename in iter_changed_jobs(
+        jobs, settings, manifest, fingerprints, skipped, force=force
+    ):
+        (folder / filename).write_bytes(b'%PDF')
+        manifest.record(filename, fingerprints.pop(row_number))
+        rendered.append(name)
+    manifest.stale()
+    manifest.save()
+    return rendered, skipped
+
+
+JOBS = [(2, 'Ana Perez', 'certificado_ana perez.pdf'),
+        (3, 'Luis Gomez', 'certificado_luis gomez.pdf')]
+
+
+def test_fingerprint_depends_on_fields_files_and_params(settings):
+    files = [settings['certificate_template']]
+    base = certificate_fingerprint({'name': 'Ana'}, files, {'size': 60})
+    assert base == certificate_fingerprint({'name': 'Ana'}, files, {'size': 60})
+    assert base != certificate_fingerprint({'name': 'Eva'}, files, {'size': 60})
+    assert base != certificate_fingerprint({'name': 'Ana'}, files, {'size': 50})
+    assert base != certificate_fingerprint({'name': 'Ana'}, [settings['font_path']],
+                                           {'size': 60})
+
+
+def test_second_run_skips_everything(tmp_path, settings):
+    assert render(JOBS, settings, tmp_path) == (['Ana Perez', 'Luis Gomez'], [])
+    assert render(JOBS, settings, tmp_path) == ([], ['Ana Perez', 'Luis Gomez'])
+    assert render(JOBS, settings, tmp_path, force=True) == (
+        ['Ana Perez', 'Luis Gomez'], []
+    )
+
+
+def test_changes_are_rendered_again(tmp_path, settings):
+    render(JOBS, settings, tmp_path)
+
+    # A deleted PDF
+    (tmp_path / 'certificado_luis gomez.pdf').unlink()
+    assert render(JOBS, settings, tmp_path) == (['Luis Gomez'], ['Ana Perez'])
+
+    # A layout parameter
+    settings['font_size'] = 50
+    assert render(JOBS, settings, tmp_path) == (['Ana Perez', 'Luis Gomez'], [])
+
+    # The template file
+    with open(settings['certificate_template'], 'wb') as f:
+        f.write(b'template v2')
+    file_digest.cache_clear()
+    assert render(JOBS, settings, tmp_path) == (['Ana Perez', 'Luis Gomez'], [])
+
+    # The output folder is not part of the fingerprint
+    settings['save_path'] = 'elsewhere'
+    assert render(JOBS, settings, tmp_path) == ([], ['Ana Perez', 'Luis Gomez'])
+
+
+def test_stale_entries(tmp_path, settings):
+    render(JOBS, settings, tmp_path)
+    (tmp_path / 'certificado_luis gomez.pdf').unlink()
+
+    saved = json.loads((tmp_path / MANIFEST_FILENAME).read_text())
+    manifest = RenderManifest(str(tmp_path))
+    assert manifest.is_current('certificado_ana perez.pdf',
+                               saved['certificado_ana perez.pdf'])
+    assert not manifest.is_current('certificado_ana perez.pdf', 'other')
+    # Luis's PDF is gone: dropped from the manifest, not reported
+    assert manifest.stale() == []
+    assert 'certificado_luis gomez.pdf' not in manifest.entries
+
+    # Ana is no longer in the roster, but her PDF is still there
+    manifest = RenderManifest(str(tmp_path))
+    assert manifest.stale() == ['certificado_ana perez.pdf']
+
+
+def test_unreadable_manifest_renders_everything(tmp_path, settings):
+    (tmp_path / MANIFEST_FILENAME).write_text('{not json')
+    assert render(JOBS, settings, tmp_path) == (['Ana Perez', 'Luis Gomez'], [])
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+import roster
+from roster import CACHE_DIR, SNIFF_BYTES, load_roster
+
+COLUMNS = {'name': 'Nombre', 'email': 1}
+
+
+def write_roster(path, text):
+    path.write_bytes(text.encode('utf-8'))
+    return str(path)
+
+
+def test_load_and_reuse_cache(tmp_path, monkeypatch):
+    path = write_roster(tmp_path / 'r.csv', 'Nombre;Email\nJosé Pérez;j@x.com\nAna;a@x.com\n')
+    records = load_roster(path, COLUMNS)
+    assert [tuple(r) for r in records] == [
+        (1, 'José Pérez', 'j@x.com'), (2, 'Ana', 'a@x.com'),
+    ]
+    (cache_file,) = os.listdir(tmp_path / CACHE_DIR)
+    assert cache_file.endswith('.json')
+
+    def no_parsing(*args, **kwargs):
+        raise AssertionError('the cache should be used')
+
+    monkeypatch.setattr(roster, 'iter_roster_chunks', no_parsing)
+    assert load_roster(path, COLUMNS) == records
+
+
+def test_unreadable_cache_is_ignored(tmp_path, capsys):
+    path = write_roster(tmp_path / 'r.csv', 'Nombre,Email\nAna,a@x.com\n')
+    load_roster(path, COLUMNS)
+    (cache_file,) = os.listdir(tmp_path / CACHE_DIR)
+    (tmp_path / CACHE_DIR / cache_file).write_text('[1, 2')
+    assert [tuple(r) for r in load_roster(path, COLUMNS)] == [(1, 'Ana', 'a@x.com')]
+    assert 'Ignoring unreadable roster cache' in capsys.readouterr().out
+
+
+def test_unwritable_cache_folder(tmp_path, capsys):
+    path = write_roster(tmp_path / 'r.csv', 'Nombre,Email\nAna,a@x.com\n')
+    # A file where the cache folder should go makes the write fail
+    (tmp_path / CACHE_DIR).write_text('')
+    assert [tuple(r) for r in load_roster(path, COLUMNS)] == [(1, 'Ana', 'a@x.com')]
+    assert 'Could not write the roster cache' in capsys.readouterr().out
+
+
+def test_cp1252_with_undefined_bytes(tmp_path):
+    # 0x81 is undefined in cp1252; the name still loads
+    path = tmp_path / 'r.csv'
+    path.write_bytes('Nombre,Email\nJosé,j@x.com\n'.encode('cp1252')
+                     + b'Ana\x81,a@x.com\n')
+    records = load_roster(str(path), COLUMNS, cache=False)
+    assert [r.name for r in records] == ['José', 'Ana�']
+
+
+def test_invalid_utf8_after_the_sniffed_block(tmp_path):
+    path = tmp_path / 'r.csv'
+    filler = ''.join(f'Persona {n},p{n}@x.com\n' for n in range(SNIFF_BYTES // 20))
+    path.write_bytes(('Nombre,Email\n' + filler).encode('utf-8')
+                     + 'José,j@x.com\n'.encode('cp1252'))
+    with pytest.raises(ValueError, match="encoding='cp1252'"):
+        load_roster(str(path), COLUMNS, cache=False)
+    records = load_roster(str(path), COLUMNS, cache=False, encoding='cp1252')
+    assert records[-1].name == 'José'
@@ -0,0 +1,93 @@
+import json
+
+from send_ledger import SendLedger, key_hash
+
+
+def read_lines(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_record_and_reload(tmp_path):
+    path = str(tmp_path / 'ledger.jsonl')
+    with SendLedger(path) as ledger:
+        ledger.record('ana perez:poster', email='ana@example.com')
+        ledger.record('luis gomez:charla', 'queued')
+        ledger.record('eva ruiz:mesa', 'dead', error='550 no such user')
+
+    ledger = SendLedger(path)
+    assert len(ledger) == 3
+    assert 'ana perez:poster' in ledger
+    assert 'luis gomez:charla' not in ledger
+    assert ledger.status('luis gomez:charla') == 'queued'
+    assert ledger.status('eva ruiz:mesa') == 'dead'
+    assert ledger.status('nobody') is None
+    assert ledger.keys('dead') == ['eva ruiz:mesa']
+    ledger.close()
+
+
+def test_later_record_replaces_earlier(tmp_path):
+    path = str(tmp_path / 'ledger.jsonl')
+    with SendLedger(path) as ledger:
+        ledger.record('ana perez:poster', 'retry', attempts=4)
+        ledger.record('ana perez:poster', 'sent')
+        assert ledger.status('ana perez:poster') == 'sent'
+    assert SendLedger(path).status('ana perez:poster') == 'sent'
+
+
+def test_torn_and_foreign_lines_are_skipped(tmp_path):
+    path = tmp_path / 'ledger.jsonl'
+    good = {'hash': key_hash('ana perez'), 'key': 'ana perez', 'status': 'sent'}
+    path.write_text(
+        json.dumps(good) + '\n'
+        + '[1, 2, 3]\n'
+        + '"just a string"\n'
+        + '{"key": "no hash"}\n'
+        + '{"hash": "abc", "key": "luis', encoding='utf-8'
+    )
+    ledger = SendLedger(str(path))
+    assert len(ledger) == 1
+    assert 'ana perez' in ledger
+
+    # The next record starts on its own line after the torn one
+    ledger.record('luis gomez')
+    ledger.close()
+    assert 'luis gomez' in SendLedger(str(path))
+
+
+def test_close_compacts_superseded_lines(tmp_path):
+    path = str(tmp_path / 'ledger.jsonl')
+    with SendLedger(path) as ledger:
+        for status in ('queued', 'retry', 'sent'):
+            ledger.record('ana perez', status)
+    assert [r['status'] for r in read_lines(path)] == ['sent']
+
+
+def test_rekey(tmp_path):
+    path = str(tmp_path / 'ledger.jsonl')
+    with SendLedger(path) as ledger:
+        ledger.record('Ana  Pérez:Poster')
+        ledger.record('luis gomez:charla')
+        assert ledger.rekey(lambda key: ' '.join(key.lower().split())) == 1
+        assert 'ana pérez:poster' in ledger
+        assert 'luis gomez:charla' in ledger
+    assert 'ana pérez:poster' in SendLedger(path)
+
+
+def test_legacy_import(tmp_path):
+    legacy = tmp_path / 'sent.json'
+    legacy.write_text(json.dumps(['ana perez:poster', 'luis gomez']))
+    path = str(tmp_path / 'ledger.jsonl')
+
+    with SendLedger(path, legacy_json=str(legacy)) as ledger:
+        assert 'ana perez:poster' in ledger
+        assert 'luis gomez' in ledger
+        ledger.record('eva ruiz:mesa')
+        assert ledger.legacy_keys() == ['ana perez:poster', 'luis gomez']
+
+    # Imported only the first time; legacy entries stay recognizable
+    legacy.write_text(json.dumps(['someone else']))
+    ledger = SendLedger(path, legacy_json=str(legacy))
+    assert 'someone else' not in ledger
+    assert ledger.legacy_keys() == ['ana perez:poster', 'luis gomez']
+    ledger.close()
@@ -0,0 +1,54 @@
+import smtplib
+
+import pytest
+
+from accounts import AccountsExhausted
+from send_retry import QuotaExceeded, RetryPolicy, classify
+
+
+@pytest.mark.parametrize('error, outcome', [
+    # Refused recipients are the only dead letters
+    (smtplib.SMTPRecipientsRefused({'a@x.com': (550, b'5.1.1 No such user')}), 'permanent'),
+    (smtplib.SMTPDataError(553, b'5.1.3 Bad recipient address syntax'), 'permanent'),
+    # Temporary failures
+    (smtplib.SMTPRecipientsRefused({'a@x.com': (451, b'4.3.0 Try again')}), 'transient'),
+    (smtplib.SMTPDataError(450, b'4.2.1 Mailbox busy'), 'transient'),
+    (smtplib.SMTPServerDisconnected('Connection unexpectedly closed'), 'transient'),
+    (TimeoutError(), 'transient'),
+    # A refused sender or login is temporary with a 4xx reply
+    (smtplib.SMTPSenderRefused(421, b'Service not available, closing channel', 'me@x.com'), 'transient'),
+    (smtplib.SMTPSenderRefused(451, b'4.3.0 Temporary server error', 'me@x.com'), 'transient'),
+    (smtplib.SMTPSenderRefused(454, b'4.7.1 Relay temporarily unavailable', 'me@x.com'), 'transient'),
+    (smtplib.SMTPAuthenticationError(421, b'Service not available'), 'transient'),
+    (smtplib.SMTPAuthenticationError(451, b'4.3.0 Temporary server error'), 'transient'),
+    (smtplib.SMTPAuthenticationError(454, b'4.7.0 Temporary authentication failure'), 'transient'),
+    # Sending limits, by enhanced status code first
+    (smtplib.SMTPDataError(550, b'5.4.5 Daily user sending quota exceeded.'), 'quota'),
+    (smtplib.SMTPSenderRefused(550, b'5.4.5 Daily sending limit exceeded', 'me@x.com'), 'quota'),
+    (smtplib.SMTPResponseException(421, b'4.7.0 Try again later, closing connection.'), 'quota'),
+    (smtplib.SMTPDataError(550, b'Daily sending limit exceeded'), 'quota'),
+    (QuotaExceeded('per_day'), 'quota'),
+    (AccountsExhausted('every account'), 'quota'),
+    # The account or the message is refused: stop the run
+    (smtplib.SMTPDataError(552, b'5.3.4 Message size exceeds fixed limit'), 'fatal'),
+    (smtplib.SMTPDataError(554, b'5.7.1 Message rejected'), 'fatal'),
+    (smtplib.SMTPAuthenticationError(535, b'5.7.8 Username and Password not accepted'), 'fatal'),
+    (smtplib.SMTPSenderRefused(553, b'5.7.1 Sender not allowed', 'me@x.com'), 'fatal'),
+    # Our own errors are never dead letters
+    (FileNotFoundError('certificado_ana.pdf'), 'pending'),
+    (ValueError('bad template'), 'pending'),
+    (None, 'pending'),
+])
+def test_classify(error, outcome):
+    assert classify(error) == outcome
+
+
+def test_retry_delay_grows_and_is_capped():
+    policy = RetryPolicy(base_delay=10, max_delay=60, jitter=0)
+    assert [policy.delay(attempt) for attempt in range(1, 6)] == [10, 20, 40, 60, 60]
+
+
+def test_retry_delay_jitter_stays_in_range():
+    policy = RetryPolicy(base_delay=10, max_delay=60, jitter=0.5)
+    for _ in range(100):
+        assert 5 <= policy.delay(1) <= 10
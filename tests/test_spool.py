@@ -0,0 +1,68 @@
+import mailbox
+import os
+
+import pytest
+
+from message_factory import MessageFactory
+from spool import Spool
+
+HEADERS = {'From': 'Congreso <org@example.com>', 'Subject': 'Certificado'}
+
+
+def messages(count):
+    factory = MessageFactory(HEADERS, "<p>Hola {name}</p>\n")
+    return [
+        factory.build(f'p{n}@example.com', {'name': f'P{n}'},
+                      attachment=b'%PDF' * 100, filename=f'c{n}.pdf')
+        for n in range(count)
+    ]
+
+
+def spool_all(path, format, count=3):
+    with Spool(path, format) as spool:
+        for message in messages(count):
+            spool.sendmail('org@example.com', ['x@example.com'], message)
+    return spool
+
+
+def test_maildir_is_lf_and_parent_is_created(tmp_path):
+    path = str(tmp_path / 'missing' / 'maildir')
+    assert spool_all(path, 'maildir').written == 3
+
+    new = os.path.join(path, 'new')
+    files = os.listdir(new)
+    assert len(files) == 3
+    for name in files:
+        with open(os.path.join(new, name), 'rb') as f:
+            assert b'\r' not in f.read()
+    box = mailbox.Maildir(path, create=False)
+    assert sorted(m['To'] for m in box) == [f'p{n}@example.com' for n in range(3)]
+
+
+def test_mbox_is_lf_and_parent_is_created(tmp_path):
+    path = str(tmp_path / 'missing' / 'out.mbox')
+    spool_all(path, 'mbox')
+
+    with open(path, 'rb') as f:
+        assert b'\r' not in f.read()
+    box = mailbox.mbox(path, create=False)
+    assert [m['To'] for m in box] == [f'p{n}@example.com' for n in range(3)]
+    attachment = list(box)[0].get_payload()[1]
+    assert attachment.get_payload(decode=True) == b'%PDF' * 100
+
+
+def test_eml_keeps_crlf_and_continues_numbering(tmp_path):
+    path = str(tmp_path / 'eml')
+    spool_all(path, 'eml', count=2)
+    spool_all(path, 'eml', count=1)
+
+    assert sorted(os.listdir(path)) == ['000001.eml', '000002.eml', '000003.eml']
+    with open(os.path.join(path, '000001.eml'), 'rb') as f:
+        message = f.read()
+    # As it would be sent
+    assert message.count(b'\n') == message.count(b'\r\n') > 0
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError, match='Unknown spool format'):
+        Spool(str(tmp_path), 'pst')
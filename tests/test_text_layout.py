@@ -0,0 +1,87 @@
+import os
+import random
+
+from PIL import Image, ImageDraw, ImageFont
+
+from create_exposition_certificates import fit_text_to_box, wrap_text
+from render_assets import get_font
+
+FONT = os.path.join(
+    os.path.dirname(__file__), '..', 'Automatization Example', 'D-DIN-Bold.ttf'
+)
+DRAW = ImageDraw.Draw(Image.new('RGB', (10, 10)))
+VOCABULARY = (
+    "efecto de la estimulación transcraneal sobre memoria trabajo en adultos "
+    "mayores con deterioro cognitivo leve: un estudio longitudinal "
+    "aleatorizado neurofisiológico AV WA Tó"
+).split()
+
+
+def old_wrap_text(text, font, max_width, draw):
+    """Word-by-word wrapping the scripts used before, for reference."""
+    lines = []
+    line = ""
+    for word in text.split():
+        test_line = line + word + " "
+        if draw.textlength(test_line, font=font) <= max_width:
+            line = test_line
+        else:
+            lines.append(line.strip())
+            line = word + " "
+    lines.append(line.strip())
+    return lines
+
+
+def old_fit_text_to_box(text, font_path, start_size, max_width, max_height, draw):
+    """Point-by-point font fitting the scripts used before, for reference."""
+    size = start_size
+    while size >= 10:
+        font = ImageFont.truetype(font_path, size)
+        lines = old_wrap_text(text, font, max_width, draw)
+        if len(lines) * (font.size + 6) - 6 <= max_height:
+            return font, lines
+        size -= 1
+    font = ImageFont.truetype(font_path, 10)
+    return font, old_wrap_text(text, font, max_width, draw)
+
+
+def test_fit_text_to_box_matches_old_loop():
+    rng = random.Random(1)
+    for _ in range(25):
+        words = rng.randint(1, 60)
+        text = " ".join(rng.choice(VOCABULARY) for _ in range(words))
+        args = (
+            text, FONT, rng.choice([8, 33, 40, 50]), rng.choice([300, 900, 1700]),
+            rng.choice([80, 150]), DRAW,
+        )
+        font, lines = fit_text_to_box(*args)
+        old_font, old_lines = old_fit_text_to_box(*args)
+        assert (font.size, lines) == (old_font.size, old_lines), text
+
+
+def test_fit_text_to_box_falls_back_to_smallest_size():
+    text = " ".join(VOCABULARY * 4)
+    font, lines = fit_text_to_box(text, FONT, 40, 200, 20, DRAW)
+    assert font.size == 10
+    assert lines == old_wrap_text(text, font, 200, DRAW)
+
+
+def test_wrap_text_matches_old_loop():
+    rng = random.Random(3)
+    for _ in range(400):
+        text = " ".join(
+            "".join(rng.choice("AVWTaoy.,-ñé") for _ in range(rng.randint(1, 12)))
+            for _ in range(rng.randint(0, 30))
+        )
+        font = get_font(FONT, rng.randint(10, 50))
+        max_width = rng.randint(0, 800)
+        assert (wrap_text(text, font, max_width, DRAW)
+                == old_wrap_text(text, font, max_width, DRAW)), (text, max_width)
+
+
+def test_wrap_text_word_wider_than_line():
+    font = get_font(FONT, 40)
+    # The first line is empty, as with the old loop; a long word later on
+    # gets a line of its own
+    assert wrap_text("neurofisiológico de", font, 50, DRAW) == ["", "neurofisiológico", "de"]
+    assert wrap_text("", font, 50, DRAW) == [""]
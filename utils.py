@@ -8,65 +8,53 @@ Created on Wed Nov 25 20:02:47 2020
 """
 #  Email
 import smtplib, ssl
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email import encoders
-from email.mime.base import MIMEBase
+from functools import lru_cache
 
 import pandas as pd
 import os
 
 # For certificate
-from PIL import Image, ImageDraw, ImageFont
+from PIL import ImageDraw
 
+from message_factory import MessageFactory
+from names import name_keys, strip_accents
+from render_assets import get_font, load_template
+
+
+
+@lru_cache(maxsize=16)
+def _mail_factory(sender_email, subject):
+    """Headers shared by all the emails with the same sender and subject"""
+    return MessageFactory(
+        {"From": sender_email, "Subject": subject}, "",
+        attachment_type="application/octet-stream",
+    )
 
 
 def format_mail(sender_email, receiver_email, subject, body, filename):
     
-    """Returns the mail with the format to be send"""
-    
-    # Create a multipart message and set headers
-    message = MIMEMultipart()
-    message["From"] = sender_email
-#    message["To"] = receiver_email
-    message["Subject"] = subject
-    message["Bcc"] = receiver_email  # Recommended for mass emails
-    
-    # Turn these into plain/html MIMEText objects
-    body_mail = MIMEText(body, "html")
+    """Returns the mail with the format to be send
     
-    # Add HTML/plain-text parts to MIMEMultipart message
-    # The email client will try to render the last part first
-    message.attach(body_mail)
+    The headers are encoded once per sender and subject (see
+    message_factory.MessageFactory); only the body and the attachment
+    are encoded for each email.
+    """
     
-    if filename == False:
-        None
-        
-    else:
-        
+    attachment = None
+    if filename != False:
         # Open PDF file in binary mode
-        with open(filename, "rb") as attachment:
-            # Add file as application/octet-stream
-            # Email client can usually download this automatically as attachment
-            part = MIMEBase("application", "octet-stream")
-            part.set_payload(attachment.read())
-        
-        # Encode file in ASCII characters to send by email    
-        encoders.encode_base64(part)
-        
-        # Add header as key/value pair to attachment part
-        part.add_header(
-            "Content-Disposition",
-            "attachment", filename = filename,
-        )
-        
-        # Add attachment to message and convert message to string
-        message.attach(part)
-        
+        with open(filename, "rb") as f:
+            attachment = f.read()
     
-    return message.as_string()
+    # Bcc recommended for mass emails
+    message = _mail_factory(sender_email, subject).build(
+        receiver_email, body=body, attachment=attachment, filename=filename,
+        recipient_header="Bcc",
+    )
     
-def send_mail(sender_email, password,receiver_email, subject, body, attachment = False):
+    return message.decode("ascii")
+    
+def send_mail(sender_email, password,receiver_email, subject, body, attachment = False, transport = None):
     
     """Sends the email
     sender_email: email of the sender
@@ -74,6 +62,9 @@ def send_mail(sender_email, password,receiver_email, subject, body, attachment =
     subject: subject of the email
     body: text content of the email in HTML format
     attachment: filename to be attached to the email
+    transport: open smtp_transport.SmtpTransport to reuse for many emails
+               (e.g. SmtpTransport("smtp.gmail.com", 587, sender_email, password));
+               if None, a new connection is opened for this email
     """
     
     smtp_server = "smtp.gmail.com"
@@ -82,6 +73,14 @@ def send_mail(sender_email, password,receiver_email, subject, body, attachment =
     # Message
     message = format_mail(sender_email, receiver_email, subject, body, filename = attachment)
     
+    # Reuse the already authenticated session
+    if transport is not None:
+        try:
+            transport.sendmail(sender_email, receiver_email, message)
+        except Exception as e:
+            print(e)
+        return
+    
     # Ask for passwords
     # password = input("Type your password and press enter: ")
     
@@ -104,26 +103,21 @@ def send_mail(sender_email, password,receiver_email, subject, body, attachment =
         server.quit() 
         
 def eliminate_accents(name):
-    
-    name = name.lower()
-    
-    name = name.replace("á", "a")
-    name = name.replace("é", "e")
-    name = name.replace("í", "i")
-    name = name.replace("ó","o")
-    name = name.replace("ú", "u")
-    name = name.replace("ü", "u")
-    name = name.replace("ñ", "n")
-    
-    return name
+    """Lowercase name without accents (see names.strip_accents)."""
+    return strip_accents(name.lower())
+
+
+def certificate_filename(name):
+    """Filename of the certificate PDF for a participant name."""
+    return 'certificado_' + name_keys(name).filename + '.pdf'
 
 
 def certificate_maker(certificate_template,student_name,text_color, location_text, font_name, text_size, align = 'left', save_path = ''):
     # Fuente y tamaño
-    font = ImageFont.truetype(font_name, text_size)
+    font = get_font(font_name, text_size)
     
-    #open file
-    im = Image.open(certificate_template)
+    #copy of the template, decoded only once per run
+    im = load_template(certificate_template)
     # crear imagen para el certificado
     d = ImageDraw.Draw(im)
     # composicion de la imagen del certidicado
@@ -147,7 +141,7 @@ def certificate_maker(certificate_template,student_name,text_color, location_tex
     #print("certificate size:", im.size)
 
     #guardar el certificado con nombre y apellido
-    im.save( save_path +'/certificado_' + eliminate_accents(student_name) + '.pdf')
+    im.save( save_path +'/' + certificate_filename(student_name))
         
 
 def font_size_by_name(student_name, max_size):